@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Benchmark yuva420p -> rgba conversion used when importing alpha webm
+# Usage: python scripts/bench_yuva_to_rgba.py [input.webm] [width] [height]
+import sys
+import time
+from pathlib import Path
+from typing import Any, List
+
+import av
+import numpy as np
+from av.codec.context import CodecContext
+from av.video.frame import VideoFrame
+
+ROOT_DIR = Path(__file__).parents[1]
+sys.path.insert(0, (ROOT_DIR / "src").as_posix())
+
+from sticker_convert.converter import yuva_to_rgba  # noqa: E402
+from sticker_convert.utils.media.yuva_converter import YuvaConverter, is_swscale_safe  # noqa: E402
+
+REPEAT = 5
+
+
+def main() -> None:
+    in_f = ROOT_DIR / "tests/samples/animated_webm_320x240_2s_vp9a.webm"
+    if len(sys.argv) > 1:
+        in_f = Path(sys.argv[1])
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 960
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 540
+
+    frames: List[VideoFrame] = []
+    with av.open(in_f.as_posix()) as container:
+        context = CodecContext.create("libvpx-vp9", "r")
+        for packet in container.demux(container.streams.video):  # type: ignore
+            for frame in context.decode(packet):  # type: ignore
+                frames.append(
+                    frame.reformat(
+                        width=width, height=height, format="yuva420p", dst_colorspace=1
+                    )
+                )
+
+    methods = {
+        "legacy": yuva_to_rgba,
+        "fixed_point": YuvaConverter().convert,
+    }
+    if is_swscale_safe():
+        methods["swscale"] = YuvaConverter(use_swscale=True).convert
+
+    reference = [yuva_to_rgba(frame) for frame in frames]
+    print(f"{len(frames)} frames of {width}x{height}, av {av.__version__}")
+    for name, method in methods.items():
+        results: "List[np.ndarray[Any, Any]]" = []
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            results = [method(frame) for frame in frames]
+        elapsed = (time.perf_counter() - start) / REPEAT / len(frames) * 1000
+        diff = max(
+            int(np.abs(result.astype(np.int16) - ref.astype(np.int16)).max())
+            for result, ref in zip(results, reference)
+        )
+        print(f"{name:12s} {elapsed:8.2f} ms/frame, max diff from legacy {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ from mergedeep import merge  # type: ignore
 
 from sticker_convert.definitions import CONFIG_DIR, DEFAULT_DIR
 from sticker_convert.job import Job
-from sticker_convert.job_option import CompOption, CredOption, InputOption, OutputOption
+from sticker_convert.job_option import SEARCH_METHODS, CompOption, CredOption, InputOption, OutputOption
 from sticker_convert.utils.callback import CallbackCli
 from sticker_convert.utils.files.json_manager import JsonManager
 from sticker_convert.utils.files.json_resources_loader import load_resource_json
@@ -119,6 +119,10 @@ class CLI:
         flags_comp_int = (
             "steps",
             "processes",
+            "parallel_steps",
+            "frame_mem_limit",
+            "decode_threads",
+            "search_budget",
             "fps_min",
             "fps_max",
             "res_min",
@@ -131,13 +135,22 @@ class CLI:
             "quality_max",
             "color_min",
             "color_max",
+            "merge_min",
+            "merge_max",
             "duration_min",
             "duration_max",
             "vid_size_max",
             "img_size_max",
             "padding_percent",
         )
-        flags_comp_float = ("fps_power", "res_power", "quality_power", "color_power")
+        flags_comp_float = (
+            "fps_power",
+            "res_power",
+            "quality_power",
+            "color_power",
+            "merge_power",
+            "estimate_margin",
+        )
         flags_comp_str = (
             "bg_color",
             "vid_format",
@@ -153,6 +166,9 @@ class CLI:
             "no_fake_vid",
             "res_snap_pow2",
             "no_res_snap_pow2",
+            "no_prescale",
+            "auto_trim",
+            "yuva_swscale",
         )
         keyword_args: Dict[str, Any]
         for k, v in self.help["comp"].items():
@@ -160,6 +176,8 @@ class CLI:
                 keyword_args = {"type": int, "default": None}
             elif k in flags_comp_float:
                 keyword_args = {"type": float, "default": None}
+            elif k == "search_method":
+                keyword_args = {"default": None, "choices": SEARCH_METHODS}
             elif k in flags_comp_str:
                 keyword_args = {"default": None}
             elif k in flags_comp_bool:
@@ -438,6 +456,9 @@ class CLI:
             color_power=self.compression_presets[preset]["color"]["power"]
             if args.color_power is None
             else args.color_power,
+            merge_min=args.merge_min,
+            merge_max=args.merge_max,
+            merge_power=1.0 if args.merge_power is None else args.merge_power,
             duration_min=self.compression_presets[preset]["duration"]["min"]
             if args.duration_min is None
             else args.duration_min,
@@ -456,6 +477,9 @@ class CLI:
             steps=self.compression_presets[preset]["steps"]
             if args.steps is None
             else args.steps,
+            search_method=args.search_method if args.search_method else "steps",
+            search_budget=args.search_budget if args.search_budget else 0,
+            estimate_margin=args.estimate_margin if args.estimate_margin else 0.0,
             fake_vid=self.compression_presets[preset]["fake_vid"]
             if args.fake_vid is None and args.no_fake_vid is None
             else args.fake_vid,
@@ -472,6 +496,12 @@ class CLI:
             else args.default_emoji,
             no_compress=args.no_compress,
             processes=args.processes if args.processes else ceil(cpu_count() / 2),
+            parallel_steps=args.parallel_steps if args.parallel_steps else 0,
+            frame_mem_limit=args.frame_mem_limit if args.frame_mem_limit else 0,
+            decode_threads=args.decode_threads if args.decode_threads else 0,
+            prescale=not args.no_prescale,
+            auto_trim=bool(args.auto_trim),
+            yuva_swscale=bool(args.yuva_swscale),
         )
 
         return opt_comp
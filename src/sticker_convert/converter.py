@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
-import json
 import os
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from copy import copy
 from fractions import Fraction
 from io import BytesIO
-from math import ceil, floor, log2
+from itertools import repeat
+from math import ceil, floor, inf, log2
+from multiprocessing import cpu_count
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Tuple, Union, cast
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Deque, Dict, Hashable, List, Literal, Optional, Set, Tuple, Union, cast
 
 import numpy as np
 from PIL import Image
 
 from sticker_convert.definitions import RUNTIME_STATE
 from sticker_convert.job_option import CompOption
-from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn
+from sticker_convert.utils.callback import CallbackProtocol, CallbackReturn, StepHintsType
 from sticker_convert.utils.chrome_remotedebug import CRD
+from sticker_convert.utils.files.buffer_reader import Buffer, buffer_size
 from sticker_convert.utils.files.cache_store import CacheStore
+from sticker_convert.utils.files.size_limited_io import SizeLimitedBytesIO, SizeLimitExceeded
 from sticker_convert.utils.media.codec_info import CodecInfo, rounding
 from sticker_convert.utils.media.ebml_duration_spoof import spoof_duration
 from sticker_convert.utils.media.format_verify import FormatVerify
+from sticker_convert.utils.media.frame_graph import FrameGraph
+from sticker_convert.utils.media.frame_resizer import FrameResizer
+from sticker_convert.utils.media.frame_stack import FrameStack, frames_color_mean
+from sticker_convert.utils.media.frame_store import FrameStore
+from sticker_convert.utils.media.lottie_renderer import LottieRenderer
+from sticker_convert.utils.media.param_search import ParamSearch
+from sticker_convert.utils.media.quantize import QuantizeCache, quantize_imagequant, quantize_imagequant_frames
+from sticker_convert.utils.media.resize_cache import RESIZE_CACHE_SIZE_MAX, ResizeCache
+from sticker_convert.utils.media.size_predictor import SizeParam, SizePredictor
+from sticker_convert.utils.media.svg_renderer import SvgRenderer
+from sticker_convert.utils.media.yuva_converter import YuvaConverter, is_swscale_safe
 from sticker_convert.utils.translate import get_translator
 
 I = get_translator()  # noqa: E741
@@ -36,6 +54,26 @@ YUV_RGB_MATRIX = np.array(
 
 LOTTIE_EXT = (".lottie", ".lot", ".tgs", ".json", ".was")
 
+# Size estimation from partial compression (See estimate_sign())
+# Compress ESTIMATE_WINDOWS windows, totalling 1/ESTIMATE_RATIO of frames
+ESTIMATE_WINDOWS = 4
+ESTIMATE_RATIO = 4
+ESTIMATE_FRAMES_MIN = 48
+
+# (res_w, res_h, quality, fps, color, merge) of a compression step
+StepParam = Tuple[
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+]
+
+# Raster frames are resampled twice if prescaled during import,
+# so only prescale if it at least halves width and height
+PRESCALE_RATIO = 0.5
+
 
 def get_step_value(
     max_step: Optional[int],
@@ -121,7 +159,7 @@ def yuva_to_rgba(frame: "VideoFrame") -> "np.ndarray[Any, Any]":
 class StickerConvert:
     def __init__(
         self,
-        in_f: Union[Path, Tuple[Path, bytes]],
+        in_f: Union[Path, Tuple[Path, Buffer]],
         out_f: Path,
         opt_comp: CompOption,
         cb: CallbackProtocol,
@@ -134,9 +172,16 @@ class StickerConvert:
         self.MSG_COMP = I(
             "[C] Compressing {} -> {} res={}x{}, quality={}, fps={}, color={} (step {}-{}-{})"
         )
+        self.MSG_COMP_SEARCH = I(
+            "[C] Compressing {} -> {} res={}x{}, quality={}, fps={}, color={} (search {}/{})"
+        )
         self.MSG_REDO_COMP = I(
             "[{}] Compressed {} -> {} but size {} {} limit {}, recompressing"
         )
+        self.MSG_ESTIMATE_COMP = I(
+            "[{}] Estimated {} -> {} from partial compression, "
+            "size {} {} limit {}, skipping"
+        )
         self.MSG_DONE_COMP = I("[S] Successful compression {} -> {} size {} (step {})")
         self.MSG_FAIL_COMP = I(
             "[F] Failed Compression {} -> {}, "
@@ -147,7 +192,7 @@ class StickerConvert:
         )
         self.MSG_SVG_LONG = I("[W] Importing SVG takes long time")
 
-        self.in_f: Union[bytes, Path]
+        self.in_f: Union[Buffer, Path]
         if isinstance(in_f, Path):
             self.in_f = in_f
             self.in_f_name = self.in_f.name
@@ -179,19 +224,35 @@ class StickerConvert:
         self.out_f_name: str = self.out_f.name
 
         self.cb = cb
-        self.frames_raw: "List[np.ndarray[Any, Any]]" = []
-        self.frames_processed: "List[np.ndarray[Any, Any]]" = []
         self.opt_comp: CompOption = opt_comp
+        frame_mem_limit = self.opt_comp.frame_mem_limit * 1024 * 1024
+        self.frames_raw = FrameStore(
+            frame_mem_limit, self.opt_comp.cache_dir, self.opt_comp.auto_trim
+        )
+        self.frames_plan: Optional[Set[int]] = None
+        self.prescale_res: Optional[Tuple[int, int]] = None
+        self.frames_import_lock = Lock()
+        self.frames_processed = FrameStack(np.empty((0, 0, 0, 4), dtype=np.uint8))
+        # Number of frames at fps each of frames_processed is held for
+        self.frames_hold: List[int] = []
+        if frame_mem_limit:
+            self.resize_cache = ResizeCache(min(RESIZE_CACHE_SIZE_MAX, frame_mem_limit))
+        else:
+            self.resize_cache = ResizeCache()
+        self.quantize_cache = QuantizeCache()
+        self.frames_key: Optional[Tuple[Any, ...]] = None
         if not self.opt_comp.steps:
             self.opt_comp.steps = 1
 
         self.size: int = 0
+        self.size_exceeded = False
         self.size_max: Optional[int] = None
         self.res_w: Optional[int] = None
         self.res_h: Optional[int] = None
         self.quality: Optional[int] = None
         self.fps: Optional[Fraction] = None
         self.color: Optional[int] = None
+        self.merge: Optional[int] = None
         self.duration_spoof = (
             self.opt_comp.duration_spoof is True
             and self.out_f.suffix.lower() in (".mkv", ".webm")
@@ -202,23 +263,30 @@ class StickerConvert:
             r, g, b, a = bytes.fromhex(self.opt_comp.bg_color)
             self.bg_color = (r, g, b, a)
 
-        self.tmp_f: BytesIO = BytesIO()
+        self.tmp_f: SizeLimitedBytesIO = SizeLimitedBytesIO()
         self.result: Optional[bytes] = None
         self.result_size: int = 0
         self.result_step: Optional[int] = None
 
         self.apngasm = None
 
+        self.predictor = SizePredictor(
+            self.codec_info_orig, self.get_in_f_size(), self.out_f.suffix
+        )
+
     @staticmethod
     def convert(
-        in_f: Union[Path, Tuple[Path, bytes]],
+        in_f: Union[Path, Tuple[Path, Buffer]],
         out_f: Path,
         opt_comp: CompOption,
         cb: CallbackProtocol,
         _cb_return: CallbackReturn,
     ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
         sticker = StickerConvert(in_f, out_f, opt_comp, cb)
-        result = sticker._convert()
+        try:
+            result = sticker._convert()
+        finally:
+            sticker.frames_raw.close()
         cb.put("update_bar")
         return result
 
@@ -235,83 +303,432 @@ class StickerConvert:
         self.cb.put((self.MSG_START_COMP.format(self.in_f_name, self.out_f_name)))
 
         steps_list = self.generate_steps_list()
+        size_params = [self.get_size_param(i) for i in steps_list]
 
+        # step_lower: Smallest step not yet known to exceed size_max
+        # step_upper: Largest step still worth trying
+        # (Known to be within size_max if upper_fits is True)
         step_lower = 0
         step_upper = self.opt_comp.steps
+        upper_fits = False
 
         if self.codec_info_orig.is_animated is True:
             self.size_max = self.opt_comp.size_max_vid
         else:
             self.size_max = self.opt_comp.size_max_img
 
+        frames_plan = self.get_frames_plan(steps_list)
+        # Size need not grow with quality for static svg rendered natively
+        # at higher resolution, which may be smaller than resampled steps
+        # Keep the best quality step within limit, instead of largest output
+        keep_best_step = False
+        # Trimmed frames would be upscaled from prescaled ones, and
+        # transparent border is only known after importing
+        if self.opt_comp.prescale and not self.opt_comp.auto_trim:
+            # Vector input is rendered at lower resolution without loss
+            if self.codec_info_orig.file_ext in LOTTIE_EXT:
+                self.prescale_res = self.get_prescale_res(steps_list, 1.0)
+            elif self.codec_info_orig.codec == "svg" and self.codec_info_orig.fps == 0:
+                # Or at higher resolution, instead of upscaling afterwards
+                self.prescale_res = self.get_prescale_res(steps_list, inf)
+                keep_best_step = True
+            else:
+                self.prescale_res = self.get_prescale_res(steps_list, PRESCALE_RATIO)
+        if self.size_max and self.opt_comp.search_method == "multidim":
+            self.frames_import(frames_plan)
+            return self.search_multidim(steps_list)
+
+        predictor_trusted = True
+        # False once predicted steps searched slower than bisection
+        predictor_halves = True
+        parallel_steps = max(self.opt_comp.parallel_steps, 1)
+
+        step_hints = cast(Optional[StepHintsType], RUNTIME_STATE.get("step_hints"))
+        hint_key = self.get_hint_key(steps_list)
+        step_hint: Optional[int] = None
+
         if self.size_max in (None, 0):
             # No limit to size, create the best quality result
-            step_current = 0
+            steps_current = [0]
         else:
-            step_current = int(rounding((step_lower + step_upper) / 2))
+            if step_hints is not None and hint_key in step_hints:
+                # Similar sticker in this job converged on this step
+                step_hint = step_hints[hint_key]
+            steps_current = self.pick_steps(
+                size_params,
+                step_lower,
+                step_upper,
+                predictor_trusted,
+                parallel_steps,
+                step_hint,
+            )
 
-        self.frames_import()
+        estimate_margin = self.opt_comp.estimate_margin
+        steps_estimated: Set[int] = set()
+
+        self.frames_import(frames_plan)
         while True:
-            param = steps_list[step_current]
-            self.res_w = param[0]
-            self.res_h = param[1]
-            self.quality = param[2]
-            if param[3] and self.codec_info_orig.fps:
-                fps_tmp = min(param[3], self.codec_info_orig.fps)
-                self.fps = self.fix_fps(fps_tmp)
-            else:
-                self.fps = Fraction(0)
-            self.color = param[4]
+            if (
+                self.size_max
+                and estimate_margin > 0
+                and len(steps_current) == 1
+                and steps_current[0] not in steps_estimated
+            ):
+                step_current = steps_current[0]
+                steps_estimated.add(step_current)
+                self.set_step_param(steps_list[step_current])
+                self.cb.put(self.get_msg_comp(step_lower, step_current, step_upper))
+                sign = self.estimate_sign(estimate_margin)
+                step_last = step_upper - 1 if upper_fits else step_upper
+                # Full compression is still needed if nothing else is left to try
+                if sign == ">" and (self.result or step_current < step_last):
+                    step_lower = step_current + 1
+                elif sign == "<":
+                    step_upper = step_current
+                    upper_fits = False
+                else:
+                    sign = None
+
+                if sign is not None:
+                    step_hint = None
+                    step_last = step_upper - 1 if upper_fits else step_upper
+                    if step_lower > step_last:
+                        return self.compress_done(
+                            cast(bytes, self.result), self.result_step
+                        )
+                    steps_current = self.pick_steps(
+                        size_params,
+                        step_lower,
+                        step_last,
+                        predictor_trusted,
+                        parallel_steps,
+                    )
+                    continue
+
+            # Number of steps still to search before this round
+            steps_left = (step_upper - 1 if upper_fits else step_upper) - step_lower + 1
+            outputs = self.compress_steps(
+                steps_list, steps_current, step_lower, step_upper
+            )
+
+            if not self.size_max:
+                self.size, _, tmp_f = outputs[0]
+                self.result = tmp_f.read()
+                self.result_size = self.size
+                self.result_step = steps_current[0]
+                return self.compress_done(self.result, self.result_step)
+
+            predictor_ready = self.predictor.ready
+            predictions = [
+                predictor_ready
+                and self.predictor.predict(size_params[i]) <= self.size_max
+                for i in steps_current
+            ]
+            predictor_trusted = predictor_halves
+            signs: List[str] = []
+            for step_current, (size, size_exceeded, tmp_f), predicted_fits in zip(
+                steps_current, outputs, predictions
+            ):
+                if keep_best_step:
+                    is_better = (
+                        self.result_step is None or step_current <= self.result_step
+                    )
+                else:
+                    is_better = size >= self.result_size
+                if size <= self.size_max and is_better:
+                    self.result = tmp_f.read()
+                    self.result_size = size
+                    self.result_step = step_current
+
+                if size_exceeded:
+                    self.predictor.update_lower_bound(size_params[step_current], size)
+                else:
+                    self.predictor.update(size_params[step_current], size)
+
+                if size <= self.size_max:
+                    sign = "<"
+                    step_upper = min(step_upper, step_current)
+                    upper_fits = True
+                else:
+                    sign = ">"
+                    step_lower = max(step_lower, step_current + 1)
+                signs.append(sign)
+                # Fallback to bisection for one round if prediction was wrong
+                if predictor_ready and predicted_fits != (sign == "<"):
+                    predictor_trusted = False
+
+            # Step known to be within limit need not be compressed again
+            step_last = step_upper - 1 if upper_fits else step_upper
+            # Bisect from now on if steps tried did not halve the interval, or
+            # correct but uninformative predictions go down one step a round
+            if step_last - step_lower + 1 > steps_left // 2:
+                predictor_halves = False
+                predictor_trusted = False
+            if step_lower > step_last:
+                self.size = outputs[-1][0]
+                if self.result:
+                    if step_hints is not None and self.result_step is not None:
+                        step_hints[hint_key] = self.result_step
+                    return self.compress_done(self.result, self.result_step)
+                return self.compress_fail()
+
+            step_center: Optional[int] = None
+            if step_hint is not None:
+                # Confirm hinted step is the boundary by trying its neighbour,
+                # fallback to full search within remaining bounds if not
+                step_center = step_last if "<" in signs else step_lower
+                step_hint = None
+            steps_current = self.pick_steps(
+                size_params,
+                step_lower,
+                step_last,
+                predictor_trusted,
+                parallel_steps,
+                step_center,
+            )
+            for (size, _, _), sign in zip(outputs, signs):
+                self.size = size
+                self.recompress(sign)
+
+    def search_multidim(
+        self, steps_list: List[StepParam]
+    ) -> Tuple[bool, Path, Union[None, bytes, Path], int]:
+        assert self.size_max
+
+        # Distinct levels of (res, quality, (fps, merge), color)
+        # and the step they start
+        # Merge threshold is searched with fps, as both reduce frames exported
+        levels: List[Dict[Any, int]] = [{}, {}, {}, {}]
+        for step, param in enumerate(steps_list):
+            fps = param[3]
+            if fps and self.codec_info_orig.fps:
+                # fps above input fps are the same level
+                fps = min(fps, ceil(self.codec_info_orig.fps))
+            values = ((param[0], param[1]), param[2], (fps, param[5]), param[4])
+            for level, value in zip(levels, values):
+                level.setdefault(value, step)
+        values_list = [list(i) for i in levels]
+        level_steps = [list(i.values()) for i in levels]
+
+        pixels: List[int] = []
+        for res_w, res_h in values_list[0]:
+            size_param = self.get_size_param((res_w, res_h, None, None, None, None))
+            pixels.append(size_param[0] * size_param[1])
+
+        # Frames exported at each (fps, merge) level, estimated from fps
+        # until it is compressed, as merging frames is only known afterwards
+        # Search predicts sizes from this list, so updates to it are used
+        frames_out = [self.get_frames_out(fps) for fps, _ in values_list[2]]
+
+        search = ParamSearch(
+            self.predictor,
+            level_steps,
+            pixels,
+            values_list[1],
+            frames_out,
+            values_list[3],
+            self.size_max,
+        )
+
+        budget = self.opt_comp.search_budget
+        if budget <= 0:
+            budget = 2 * ceil(log2(len(steps_list)))
+
+        sign: Optional[str] = None
+        for count in range(1, budget + 1):
+            point = search.next_point()
+            if point is None:
+                break
+            if sign is not None:
+                self.recompress(sign)
 
-            self.tmp_f = BytesIO()
-            msg = self.MSG_COMP.format(
+            (res_w, res_h), quality, (fps, merge), color = (
+                values[i] for values, i in zip(values_list, point)
+            )
+            param = (res_w, res_h, quality, fps, color, merge)
+            self.set_step_param(param)
+            msg = self.MSG_COMP_SEARCH.format(
                 self.in_f_name,
                 self.out_f_name,
                 self.res_w,
                 self.res_h,
                 self.quality,
-                int(self.fps),
+                int(cast(Fraction, self.fps)),
                 self.color,
-                step_lower,
-                step_current,
-                step_upper,
+                count,
+                budget,
             )
             self.cb.put(msg)
 
-            self.frames_processed = self.frames_drop(self.frames_raw)
-            self.frames_processed = self.frames_resize(self.frames_processed)
-            self.frames_export()
-
-            self.tmp_f.seek(0)
-            self.size = self.tmp_f.getbuffer().nbytes
+            # Size model needs actual size of oversized results
+            self.compress_step(None)
+            frames_out[point[2]] = len(self.frames_processed)
+            res_w, res_h, quality, _, color = self.get_size_param(param)
+            self.predictor.update(
+                (res_w, res_h, quality, frames_out[point[2]], color), self.size
+            )
 
-            if not self.size_max or (
-                self.size <= self.size_max and self.size >= self.result_size
-            ):
+            fits = self.size <= self.size_max
+            search.update(point, fits)
+            if fits and search.point_best == point:
                 self.result = self.tmp_f.read()
                 self.result_size = self.size
-                self.result_step = step_current
+                self.result_step = max(steps[i] for steps, i in zip(level_steps, point))
+            sign = "<" if fits else ">"
 
-            if (
-                step_upper - step_lower > 0
-                and step_current != step_lower
-                and self.size_max
+        if self.result:
+            return self.compress_done(self.result, self.result_step)
+        return self.compress_fail()
+
+    def compress_steps(
+        self,
+        steps_list: List[StepParam],
+        steps_current: List[int],
+        step_lower: int,
+        step_upper: int,
+    ) -> List[Tuple[int, bool, BytesIO]]:
+        if len(steps_current) == 1:
+            self.set_step_param(steps_list[steps_current[0]])
+            self.cb.put(self.get_msg_comp(step_lower, steps_current[0], step_upper))
+            self.compress_step(self.size_max)
+            return [(self.size, self.size_exceeded, self.tmp_f)]
+
+        # Compress candidate steps in threads on shallow copies of self
+        # Encoders and quantizer release GIL, while frames_raw is only read
+        if self.bg_color is None:
+            self.bg_color = self.determine_bg_color()
+        workers: List[StickerConvert] = []
+        for step_current in steps_current:
+            worker = copy(self)
+            worker.apngasm = None
+            worker.set_step_param(steps_list[step_current])
+            self.cb.put(worker.get_msg_comp(step_lower, step_current, step_upper))
+            workers.append(worker)
+
+        with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+            for _ in executor.map(
+                StickerConvert.compress_step, workers, repeat(self.size_max)
             ):
-                if self.size <= self.size_max:
-                    sign = "<"
-                    step_upper = step_current
-                else:
-                    sign = ">"
-                    step_lower = step_current
-                if step_current == step_lower + 1:
-                    step_current = step_lower
-                else:
-                    step_current = int(rounding((step_lower + step_upper) / 2))
-                self.recompress(sign)
-            elif self.result:
-                return self.compress_done(self.result, self.result_step)
-            else:
-                return self.compress_fail()
+                pass
+
+        return [(worker.size, worker.size_exceeded, worker.tmp_f) for worker in workers]
+
+    def estimate_sign(self, margin: float) -> Optional[str]:
+        # Compress evenly spaced windows of frames, then extrapolate by frame count
+        # Return sign only if estimated size is clearly off from size_max
+        assert self.size_max
+        frames_index = self.frames_drop_index(len(self.frames_raw))
+        frames_count = len(frames_index)
+        if frames_count < ESTIMATE_FRAMES_MIN:
+            return None
+
+        window = frames_count // (ESTIMATE_WINDOWS * ESTIMATE_RATIO)
+        frames_sampled: List[int] = []
+        for i in range(ESTIMATE_WINDOWS):
+            start = (frames_count - window) * i // (ESTIMATE_WINDOWS - 1)
+            frames_sampled.extend(frames_index[start : start + window])
+        ratio = frames_count / len(frames_sampled)
+
+        size_over = self.size_max * (1 + margin)
+        size_under = self.size_max * (1 - margin)
+        self.compress_step(int(size_over / ratio), frames_sampled)
+        size_estimated = int(self.size * ratio)
+
+        if size_estimated > size_over:
+            sign = ">"
+        elif size_estimated < size_under:
+            sign = "<"
+        else:
+            return None
+
+        msg = self.MSG_ESTIMATE_COMP.format(
+            sign,
+            self.in_f_name,
+            self.out_f_name,
+            size_estimated,
+            sign,
+            self.size_max,
+        )
+        self.cb.put(msg)
+        return sign
+
+    def compress_step(
+        self, size_limit: Optional[int], frames_index: Optional[List[int]] = None
+    ) -> None:
+        # Abort once size_limit is exceeded, as result would be discarded anyway
+        self.tmp_f = SizeLimitedBytesIO(size_limit)
+        if frames_index is None:
+            frames_index = self.frames_drop_index(len(self.frames_raw))
+        with self.frames_import_lock:
+            frames_missing = self.frames_raw.missing(frames_index)
+            if frames_missing:
+                # Input has more frames than get_frames_plan() expected
+                self.frames_import(set(frames_missing))
+            # Transparent border of all frames imported is trimmed, if auto_trim
+            bbox = self.frames_raw.bbox
+        if self.res_w is None:
+            self.res_w = bbox[2] - bbox[0] if bbox else self.frames_raw[0].shape[1]
+        if self.res_h is None:
+            self.res_h = bbox[3] - bbox[1] if bbox else self.frames_raw[0].shape[0]
+        # Steps sharing resolution only need resizing once
+        # Held frames refer to one source frame, which is resized once
+        # and repeated only when taken for export
+        resize_key = (
+            self.res_w,
+            self.res_h,
+            self.opt_comp.scale_filter,
+            self.opt_comp.padding_percent,
+            bbox,
+        )
+        frames_source = [self.frames_raw.source(i) for i in frames_index]
+        frames_resized = self.resize_cache.get_frames(
+            resize_key,
+            frames_source,
+            len(self.frames_raw),
+            lambda index: self.frames_resize([self.frames_raw[i] for i in index], bbox),
+        )
+        # Identical, or below merge threshold similar, consecutive frames
+        # are exported once, and held for longer
+        self.frames_processed, self.frames_hold = frames_resized.dedup(self.merge or 0)
+        # Frames processed are determined by these, so quantization of them
+        # is cached by this instead of by hashing their pixels
+        self.frames_key = (resize_key, tuple(frames_source), self.merge or 0)
+        try:
+            self.frames_export()
+            self.size_exceeded = False
+            self.size = self.tmp_f.getbuffer().nbytes
+        except SizeLimitExceeded as e:
+            # Size is only a lower bound
+            self.size_exceeded = True
+            self.size = e.size
+
+        self.tmp_f.seek(0)
+
+    def set_step_param(self, param: StepParam) -> None:
+        self.res_w = param[0]
+        self.res_h = param[1]
+        self.quality = param[2]
+        if param[3] and self.codec_info_orig.fps:
+            fps_tmp = min(param[3], self.codec_info_orig.fps)
+            self.fps = self.fix_fps(fps_tmp)
+        else:
+            self.fps = Fraction(0)
+        self.color = param[4]
+        self.merge = param[5]
+
+    def get_msg_comp(self, step_lower: int, step_current: int, step_upper: int) -> str:
+        return self.MSG_COMP.format(
+            self.in_f_name,
+            self.out_f_name,
+            self.res_w,
+            self.res_h,
+            self.quality,
+            int(cast(Fraction, self.fps)),
+            self.color,
+            step_lower,
+            step_current,
+            step_upper,
+        )
 
     def check_if_compatible(self) -> Optional[bytes]:
         f_fmt = self.opt_comp.get_format()
@@ -348,15 +765,15 @@ class StickerConvert:
                     result = f.read()
                 self.result_size = os.path.getsize(self.in_f)
             else:
-                result = self.in_f
-                self.result_size = len(self.in_f)
+                result = bytes(self.in_f)
+                self.result_size = len(result)
 
             return result
 
         return None
 
-    def generate_steps_list(self) -> List[Tuple[Optional[int], ...]]:
-        steps_list: List[Tuple[Optional[int], ...]] = []
+    def generate_steps_list(self) -> List[StepParam]:
+        steps_list: List[StepParam] = []
         need_even = self.out_f.suffix in (".webm", ".mp4", ".mkv", ".webp")
         for step in range(self.opt_comp.steps, -1, -1):
             steps_list.append(
@@ -400,11 +817,138 @@ class StickerConvert:
                         self.opt_comp.steps,
                         self.opt_comp.color_power,
                     ),
+                    # Lowest threshold of merging frames at first step
+                    get_step_value(
+                        self.opt_comp.merge_min,
+                        self.opt_comp.merge_max,
+                        step,
+                        self.opt_comp.steps,
+                        self.opt_comp.merge_power,
+                    ),
                 )
             )
 
         return steps_list
 
+    def get_hint_key(self, steps_list: List[StepParam]) -> Tuple[Any, ...]:
+        # Bucket input by properties that affect which step would fit
+        res_w, res_h = self.codec_info_orig.res
+        return (
+            self.codec_info_orig.codec,
+            self.codec_info_orig.is_animated,
+            res_w // 64,
+            res_h // 64,
+            int(log2(max(self.codec_info_orig.frames, 1))),
+            self.out_f.suffix.lower(),
+            self.size_max,
+            tuple(steps_list),
+        )
+
+    def get_in_f_size(self) -> int:
+        if isinstance(self.in_f, Path):
+            return os.path.getsize(self.in_f)
+        return buffer_size(self.in_f)
+
+    def get_frames_out(self, fps: Optional[int]) -> int:
+        # Approximate number of frames frames_drop_index() would output at fps
+        if not self.codec_info_orig.is_animated or not fps:
+            return 1
+
+        duration = self.codec_info_orig.duration
+        if self.duration_spoof is False:
+            if self.opt_comp.duration_min:
+                duration = max(duration, self.opt_comp.duration_min)
+            if self.opt_comp.duration_max:
+                duration = min(duration, self.opt_comp.duration_max)
+
+        fps_out = min(fps, self.codec_info_orig.fps)
+        return max(1, int(rounding(fps_out * duration / 1000)))
+
+    def get_frames_plan(self, steps_list: List[StepParam]) -> Optional[Set[int]]:
+        # Index of input frames that frames_drop_index() of any step may keep
+        # None if all frames are needed
+        if not self.codec_info_orig.is_animated or not self.codec_info_orig.fps:
+            return None
+
+        # Upper bound of input frames, with room for inaccurate codec_info
+        # Frames beyond it are imported later if actually needed
+        frames_count = max(
+            self.codec_info_orig.frames,
+            ceil(self.codec_info_orig.duration * self.codec_info_orig.fps / 1000),
+        )
+        frames_bound = 2 * frames_count + 1
+
+        worker = copy(self)
+        frames_plan: Set[int] = set()
+        for param in steps_list:
+            worker.set_step_param(param)
+            frames_plan.update(worker.frames_drop_index(frames_bound))
+        return frames_plan
+
+    def get_prescale_res(
+        self, steps_list: List[StepParam], scale_max: float
+    ) -> Optional[Tuple[int, int]]:
+        # Smallest even resolution of input that frames_resize() of any step
+        # would not upscale. None if not smaller than scale_max of input
+        width, height = self.codec_info_orig.res
+        if not width or not height:
+            return None
+
+        scaling = 1 - (self.opt_comp.padding_percent / 100)
+        scale = 0.0
+        for param in steps_list:
+            res_w = param[0] if param[0] else width
+            res_h = param[1] if param[1] else height
+            scale = max(scale, min(res_w / width, res_h / height) * scaling)
+        if scale >= scale_max or scale == 0:
+            return None
+
+        width_new = ceil(width * scale)
+        height_new = ceil(height * scale)
+        return width_new + width_new % 2, height_new + height_new % 2
+
+    def get_size_param(self, param: StepParam) -> SizeParam:
+        res_w, res_h, quality, fps, color = param[:5]
+        return (
+            res_w if res_w else self.codec_info_orig.res[0],
+            res_h if res_h else self.codec_info_orig.res[1],
+            quality,
+            self.get_frames_out(fps),
+            color,
+        )
+
+    def pick_steps(
+        self,
+        size_params: List[SizeParam],
+        step_lower: int,
+        step_upper: int,
+        predictor_trusted: bool,
+        count: int,
+        step_center: Optional[int] = None,
+    ) -> List[int]:
+        assert self.size_max
+        count = min(count, step_upper - step_lower + 1)
+        if step_center is None and predictor_trusted and self.predictor.ready:
+            step_center = self.predictor.boundary(
+                size_params, step_lower, step_upper, self.size_max
+            )
+        if step_center is not None:
+            # Steps around expected boundary, so it may be confirmed in one round
+            start = min(step_center - count // 2, step_upper - count + 1)
+            start = max(start, step_lower)
+            return list(range(start, start + count))
+        # Split search interval evenly
+        return sorted(
+            {
+                int(
+                    rounding(
+                        step_lower + (step_upper - step_lower) * (i + 1) / (count + 1)
+                    )
+                )
+                for i in range(count)
+            }
+        )
+
     def recompress(self, sign: str) -> None:
         msg = self.MSG_REDO_COMP.format(
             sign, self.in_f_name, self.out_f_name, self.size, sign, self.size_max
@@ -450,28 +994,24 @@ class StickerConvert:
         else:
             suffix = Path(self.in_f_name).suffix
 
-        in_f: Union[Path, BytesIO]
-        if isinstance(self.in_f, Path):
-            in_f = self.in_f
-        else:
-            in_f = BytesIO(self.in_f)
-
         if suffix == ".was":
             import zipfile
 
-            with zipfile.ZipFile(in_f, "r") as zip_f:
-                data = zip_f.read("animation/animation.json")
+            with CodecInfo.open_file(self.in_f) as file_ref:
+                with zipfile.ZipFile(file_ref, "r") as zip_f:
+                    data = zip_f.read("animation/animation.json")
         elif suffix == ".tgs":
             import gzip
 
-            with gzip.open(in_f) as f:
+            with CodecInfo.open_file(self.in_f) as file_ref, gzip.open(file_ref) as f:
                 data = f.read()
         else:
             if isinstance(self.in_f, Path):
                 with open(self.in_f, "rb") as f:
                     data = f.read()
             else:
-                data = self.in_f
+                # No copy if already bytes
+                data = bytes(self.in_f)
 
         if self.out_f.stem == "none":
             out_f = None
@@ -487,7 +1027,10 @@ class StickerConvert:
 
         return True, self.in_f_path, out_f, len(data)
 
-    def frames_import(self) -> None:
+    def frames_import(self, frames_plan: Optional[Set[int]] = None) -> None:
+        # frames_plan: Index of frames to import, others are skipped
+        # Can be called again to import frames that were skipped
+        self.frames_plan = frames_plan
         if isinstance(self.in_f, Path):
             suffix = self.in_f.suffix
         else:
@@ -507,17 +1050,48 @@ class StickerConvert:
         else:
             self._frames_import_pyav()
 
+    def frames_raw_wanted(self, index: int, is_last: bool = False) -> bool:
+        if not self.frames_raw.missing([index]):
+            return False
+        # Last frame may be used for reaching duration_min, whatever the plan
+        return is_last or self.frames_plan is None or index in self.frames_plan
+
+    def frames_raw_put(
+        self, index: int, frame: "Optional[np.ndarray[Any, Any]]"
+    ) -> None:
+        # None marks a skipped frame
+        if index >= len(self.frames_raw):
+            self.frames_raw.append(frame)
+        elif frame is not None and self.frames_raw.missing([index]):
+            self.frames_raw.put(index, frame)
+
+    def frames_raw_put_ref(self, index: int, source: int) -> None:
+        # Frame is identical to imported frame at index source
+        if index >= len(self.frames_raw):
+            self.frames_raw.append(None)
+        if self.frames_raw.missing([index]):
+            self.frames_raw.put_ref(index, source)
+
     def _frames_import_svg_static(self) -> None:
         import resvg_py
 
-        if isinstance(self.in_f, bytes):
-            svg = self.in_f.decode()
+        if not isinstance(self.in_f, Path):
+            svg = str(self.in_f, "utf-8")
         else:
             with open(self.in_f) as f:
                 svg = f.read()
 
-        png_bytes = resvg_py.svg_to_bytes(svg_string=svg)
-        self.frames_raw.append(np.asarray(Image.open(BytesIO(png_bytes))))
+        # resvg_py only outputs png. Rendering at resolution of output avoids
+        # rasterizing more pixels than needed, or upscaling afterwards
+        if self.prescale_res is not None:
+            width, height = self.prescale_res
+            png_bytes = resvg_py.svg_to_bytes(
+                svg_string=svg, width=width, height=height
+            )
+        else:
+            png_bytes = resvg_py.svg_to_bytes(svg_string=svg)
+        with Image.open(BytesIO(png_bytes)) as im:
+            self.frames_raw.append(np.asarray(im))
 
     def _frames_import_svg_anim(self) -> None:
         from bs4 import BeautifulSoup
@@ -540,6 +1114,10 @@ class StickerConvert:
                 "--disable-gpu-rasterization",
                 "--hide-scrollbars",
                 "--force-device-scale-factor=1",
+                # Tabs other than the first one render concurrently
+                "--disable-background-timer-throttling",
+                "--disable-backgrounding-occluded-windows",
+                "--disable-renderer-backgrounding",
                 "about:blank",
             ]
             if chrome_path is None:
@@ -549,10 +1127,16 @@ class StickerConvert:
             self.cb.put(self.MSG_SVG_LONG)
             RUNTIME_STATE["crd"] = CRD(chrome_path, args=args)
             RUNTIME_STATE["crd"].connect(-1)  # type: ignore
+            threads = self.opt_comp.decode_threads
+            if threads == 0:
+                threads = cpu_count()
+            RUNTIME_STATE["svg_renderer"] = SvgRenderer(
+                RUNTIME_STATE["crd"], max_tabs=threads
+            )
 
-        crd = cast(CRD, RUNTIME_STATE["crd"])
-        if isinstance(self.in_f, bytes):
-            svg = self.in_f.decode()
+        svg_renderer = cast(SvgRenderer, RUNTIME_STATE["svg_renderer"])
+        if not isinstance(self.in_f, Path):
+            svg = str(self.in_f, "utf-8")
         else:
             with open(self.in_f) as f:
                 svg = f.read()
@@ -565,38 +1149,34 @@ class StickerConvert:
             svg_tag["height"] = height
         svg = str(soup)
 
-        crd.open_html_str(svg)
-        crd.set_transparent_bg()
-        init_js = 'svg = document.getElementsByTagName("svg")[0];'
-        if self.codec_info_orig.fps > 0:
-            init_js += "svg.pauseAnimations();"
-        init_js += "JSON.stringify(svg.getBoundingClientRect());"
-        bound = json.loads(
-            json.loads(crd.exec_js(init_js))["result"]["result"]["value"]
-        )
-        clip = {
-            "x": bound["x"],
-            "y": bound["y"],
-            "width": width,
-            "height": height,
-            "scale": 1,
-        }
-
         if self.codec_info_orig.fps > 0:
-            for i in range(self.codec_info_orig.frames):
-                curr_time = (
-                    i
-                    / self.codec_info_orig.frames
-                    * self.codec_info_orig.duration
-                    / 1000
-                )
-                crd.exec_js(f"svg.setCurrentTime({curr_time})")
-                self.frames_raw.append(np.asarray(crd.screenshot(clip)))
+            frames_total = self.codec_info_orig.frames
+            frames_render = [
+                i
+                for i in range(frames_total)
+                if self.frames_raw_wanted(i, is_last=i == frames_total - 1)
+            ]
+            times = [
+                i / frames_total * self.codec_info_orig.duration / 1000
+                for i in frames_render
+            ]
+            threads = self.opt_comp.decode_threads
+            if threads == 0:
+                threads = cpu_count()
+            frames_rendered = iter(
+                svg_renderer.render(svg, (width, height), times, threads)
+            )
+            frames_render_set = set(frames_render)
+            for i in range(frames_total):
+                if i in frames_render_set:
+                    self.frames_raw_put(i, next(frames_rendered))
+                else:
+                    self.frames_raw_put(i, None)
         else:
-            self.frames_raw.append(np.asarray(crd.screenshot(clip)))
+            self.frames_raw.append(svg_renderer.render_static(svg, (width, height)))
 
     def _frames_import_pillow(self) -> None:
-        with Image.open(self.in_f) as im:
+        with CodecInfo.open_file(self.in_f) as file_ref, Image.open(file_ref) as im:
             # Note: im.convert("RGBA") would return rgba image of current frame only
             if (
                 "n_frames" in dir(im)
@@ -615,18 +1195,39 @@ class StickerConvert:
                 duration_ptr = 0.0
                 duration_inc = 1 / self.codec_info_orig.fps * 1000
                 frame = 0
+                frame_index = 0
+                # Index of first imported tick of current frame
+                # Following ticks refer to it instead of converting again
+                hold_index: Optional[int] = None
                 if durations is None:
                     next_frame_start_duration = cast(int, im.info.get("duration", 1000))
                 else:
                     next_frame_start_duration = durations[0]
                 while True:
-                    self.frames_raw.append(np.asarray(im.convert("RGBA")))
                     duration_ptr += duration_inc
+                    is_last = (
+                        duration_ptr >= next_frame_start_duration
+                        and frame + 1 == im.n_frames
+                    )
+                    # Frames are seeked anyway, only conversion is skipped
+                    wanted = self.frames_raw_wanted(frame_index, is_last)
+                    if wanted and hold_index is not None:
+                        self.frames_raw_put_ref(frame_index, hold_index)
+                    elif wanted:
+                        self.frames_raw_put(frame_index, self._frame_pillow_to_rgba(im))
+                    else:
+                        self.frames_raw_put(frame_index, None)
+                    if hold_index is None and not self.frames_raw.missing(
+                        [frame_index]
+                    ):
+                        hold_index = frame_index
+                    frame_index += 1
                     if duration_ptr >= next_frame_start_duration:
                         frame += 1
                         if frame == im.n_frames:
                             break
                         im.seek(frame)
+                        hold_index = None
 
                         if durations is None:
                             next_frame_start_duration += cast(
@@ -635,7 +1236,13 @@ class StickerConvert:
                         else:
                             next_frame_start_duration += durations[frame]
             else:
-                self.frames_raw.append(np.asarray(im.convert("RGBA")))
+                self.frames_raw_put(0, self._frame_pillow_to_rgba(im))
+
+    def _frame_pillow_to_rgba(self, im: Image.Image) -> "np.ndarray[Any, Any]":
+        im_rgba = im.convert("RGBA")
+        if self.prescale_res is not None:
+            im_rgba = im_rgba.resize(self.prescale_res, resample=Image.Resampling.BOX)
+        return np.asarray(im_rgba)
 
     def _frames_import_pyav(self) -> None:
         import av
@@ -646,12 +1253,7 @@ class StickerConvert:
 
         # Crashes when handling some webm in yuv420p and convert to rgba
         # https://github.com/PyAV-Org/PyAV/issues/1166
-        file: Union[BytesIO, str]
-        if isinstance(self.in_f, Path):
-            file = self.in_f.as_posix()
-        else:
-            file = BytesIO(self.in_f)
-        with av.open(file) as container:
+        with CodecInfo.open_file(self.in_f) as file_ref, av.open(file_ref) as container:
             container = cast(InputContainer, container)
             context = container.streams.video[0].codec_context
             if context.name == "vp8":
@@ -661,59 +1263,115 @@ class StickerConvert:
                     VideoCodecContext, CodecContext.create("libvpx-vp9", "r")
                 )
 
+            stream = container.streams.video[0]
+            # 0 lets FFmpeg decide number of threads
+            decode_threads = self.opt_comp.decode_threads
+            if decode_threads != 1:
+                context.thread_type = "AUTO"
+                context.thread_count = decode_threads
+
+            # Only used by one thread at a time, by converter or this thread
+            frame_graph = FrameGraph(stream.time_base, self.prescale_res)
+            yuva_converter = YuvaConverter(
+                use_swscale=self.opt_comp.yuva_swscale and is_swscale_safe()
+            )
+            # Convert previous frames to RGBA while decoding next frames
+            converter = None
+            if decode_threads != 1:
+                converter = ThreadPoolExecutor(max_workers=1)
+            # Frames in input order, None if skipped
+            pending: "Deque[Tuple[int, Union[None, np.ndarray[Any, Any], Future[np.ndarray[Any, Any]]]]]" = deque()
+            # Decoding waits for converter beyond this many frames, so that
+            # decoded frames do not pile up when converter is slower
+            pending_max = 2 * (decode_threads if decode_threads > 0 else cpu_count())
+
+            def put_pending(pending_max: int) -> None:
+                while pending:
+                    index, frame_rgba = pending[0]
+                    if isinstance(frame_rgba, Future):
+                        if len(pending) <= pending_max and not frame_rgba.done():
+                            break
+                        frame_rgba = frame_rgba.result()
+                    pending.popleft()
+                    self.frames_raw_put(index, frame_rgba)
+
+            frame_index = 0
+            frame_last: Optional[Tuple[int, VideoFrame]] = None
             for packet in container.demux(container.streams.video):
                 for frame in context.decode(packet):  # type: ignore
-                    width_orig = frame.width
-                    height_orig = frame.height
-
-                    # Need to pad frame to even dimension first
-                    if width_orig % 2 == 1 or height_orig % 2 == 1:
-                        from av.filter import Graph
-
-                        width_new = width_orig + width_orig % 2
-                        height_new = height_orig + height_orig % 2
-
-                        graph = Graph()
-                        in_src = graph.add_buffer(template=container.streams.video[0])
-                        pad = graph.add(
-                            "pad", f"{width_new}:{height_new}:0:0:color=#00000000"
-                        )
-                        in_src.link_to(pad)
-                        sink = graph.add("buffersink")
-                        pad.link_to(sink)
-                        graph.configure()
-
-                        graph.push(frame)
-                        frame_resized = cast(VideoFrame, graph.pull())
-                    else:
-                        frame_resized = frame
-
-                    # yuva420p may cause crash
-                    # Not safe to directly call frame.to_ndarray(format="rgba")
-                    # https://github.com/PyAV-Org/PyAV/discussions/1510
-                    # if int(av.__version__.split(".")[0]) >= 14:
-                    #     rgba_array = frame_resized.to_ndarray(format="rgba")
-                    if frame_resized.format.name == "yuv420p":
-                        rgb_array = frame_resized.to_ndarray(format="rgb24")
-                        rgba_array = np.dstack(
-                            (
-                                rgb_array,
-                                cast(
-                                    np.ndarray[Any, np.dtype[np.uint8]],
-                                    np.zeros(rgb_array.shape[:2], dtype=np.uint8) + 255,
-                                ),
-                            )
+                    # Frames are decoded anyway, only conversion is skipped
+                    if not self.frames_raw_wanted(frame_index):
+                        pending.append((frame_index, None))
+                        frame_last = (frame_index, frame)
+                    elif converter is None:
+                        rgba_array = self._frame_pyav_to_rgba(
+                            frame, frame_graph, yuva_converter
                         )
+                        pending.append((frame_index, rgba_array))
+                        frame_last = None
                     else:
-                        frame_resized = frame_resized.reformat(
-                            format="yuva420p",
-                            dst_colorspace=1,
+                        future = converter.submit(
+                            self._frame_pyav_to_rgba, frame, frame_graph, yuva_converter
                         )
-                        rgba_array = yuva_to_rgba(frame_resized)
+                        pending.append((frame_index, future))
+                        frame_last = None
+                    frame_index += 1
+                    put_pending(pending_max)
+
+            put_pending(0)
+            if converter is not None:
+                converter.shutdown()
+
+            # Number of frames is only known at the end
+            if frame_last is not None and self.frames_raw_wanted(
+                frame_last[0], is_last=True
+            ):
+                rgba_array = self._frame_pyav_to_rgba(
+                    frame_last[1], frame_graph, yuva_converter
+                )
+                self.frames_raw_put(frame_last[0], rgba_array)
+
+    def _frame_pyav_to_rgba(
+        self,
+        frame: "VideoFrame",
+        frame_graph: FrameGraph,
+        yuva_converter: YuvaConverter,
+    ) -> "np.ndarray[Any, Any]":
+        if self.prescale_res is not None:
+            width_orig, height_orig = self.prescale_res
+        else:
+            width_orig = frame.width
+            height_orig = frame.height
+        pix_fmt = "yuv420p" if frame.format.name == "yuv420p" else "yuva420p"
+
+        # Need to pad frame to even dimension first
+        if self.prescale_res is not None or width_orig % 2 == 1 or height_orig % 2 == 1:
+            frame_resized = frame_graph.process(frame, pix_fmt)
+        else:
+            frame_resized = frame
+
+        if pix_fmt == "yuv420p":
+            rgb_array = frame_resized.to_ndarray(format="rgb24")
+            rgba_array = np.dstack(
+                (
+                    rgb_array,
+                    cast(
+                        np.ndarray[Any, np.dtype[np.uint8]],
+                        np.zeros(rgb_array.shape[:2], dtype=np.uint8) + 255,
+                    ),
+                )
+            )
+        else:
+            if frame_resized is frame:
+                # Converted by frame_graph otherwise
+                frame_resized = frame_resized.reformat(
+                    format="yuva420p",
+                    dst_colorspace=1,
+                )
+            rgba_array = yuva_converter.convert(frame_resized)
 
-                    # Remove pixels that was added to make dimensions even
-                    rgba_array = rgba_array[0:height_orig, 0:width_orig]
-                    self.frames_raw.append(rgba_array)
+        # Remove pixels that was added to make dimensions even
+        return rgba_array[0:height_orig, 0:width_orig]
 
     def _frames_import_lottie(self) -> None:
         from rlottie_python.rlottie_wrapper import LottieAnimation
@@ -723,64 +1381,82 @@ class StickerConvert:
         else:
             suffix = Path(self.in_f_name).suffix
 
+        # Read once, as each render thread loads its own animation
+        anim_json: Optional[str] = None
         if suffix == ".was":
             import zipfile
 
-            in_f: Union[Path, BytesIO]
-            if isinstance(self.in_f, Path):
-                in_f = self.in_f
-            else:
-                in_f = BytesIO(self.in_f)
-            with zipfile.ZipFile(in_f, "r") as zip_f:
-                anim_json = zip_f.read("animation/animation.json").decode("utf-8")
-            anim = LottieAnimation.from_data(anim_json)
+            with CodecInfo.open_file(self.in_f) as file_ref:
+                with zipfile.ZipFile(file_ref, "r") as zip_f:
+                    anim_json = zip_f.read("animation/animation.json").decode("utf-8")
         elif suffix == ".tgs":
-            if isinstance(self.in_f, Path):
-                anim = LottieAnimation.from_tgs(self.in_f.as_posix())
-            else:
-                import gzip
+            import gzip
 
-                with gzip.open(BytesIO(self.in_f)) as f:
-                    data = f.read().decode(encoding="utf-8")
-                anim = LottieAnimation.from_data(data)
+            with CodecInfo.open_file(self.in_f) as file_ref, gzip.open(file_ref) as f:
+                anim_json = f.read().decode(encoding="utf-8")
+        elif not isinstance(self.in_f, Path):
+            anim_json = str(self.in_f, "utf-8")
+
+        def load() -> LottieAnimation:
+            if anim_json is None:
+                # From file, so that resources are looked up next to it
+                assert isinstance(self.in_f, Path)
+                return LottieAnimation.from_file(self.in_f.as_posix())
+            return LottieAnimation.from_data(anim_json)
+
+        anim = load()
+        frames_total = anim.lottie_animation_get_totalframe()
+        if self.prescale_res is not None:
+            size = self.prescale_res
         else:
-            if isinstance(self.in_f, Path):
-                anim = LottieAnimation.from_file(self.in_f.as_posix())
-            else:
-                anim = LottieAnimation.from_data(self.in_f.decode("utf-8"))
-
-        for i in range(anim.lottie_animation_get_totalframe()):
-            frame = np.asarray(anim.render_pillow_frame(frame_num=i))
-            self.frames_raw.append(frame)
-
+            size = anim.lottie_animation_get_size()
         anim.lottie_animation_destroy()
 
+        frames_render = [
+            i
+            for i in range(frames_total)
+            if self.frames_raw_wanted(i, is_last=i == frames_total - 1)
+        ]
+        threads = self.opt_comp.decode_threads
+        if threads == 0:
+            threads = cpu_count()
+        renderer = LottieRenderer(load, size, threads)
+        # Rendered in order of frames_render
+        frames_rendered = renderer.render_frames(frames_render)
+        try:
+            frames_render_set = set(frames_render)
+            for i in range(frames_total):
+                if i in frames_render_set:
+                    self.frames_raw_put(i, next(frames_rendered))
+                else:
+                    self.frames_raw_put(i, None)
+        finally:
+            # Wait for render threads before destroying their animations
+            frames_rendered.close()
+            renderer.close()
+
     def determine_bg_color(self) -> Tuple[int, int, int, int]:
         mean_total = 0.0
         # Calculate average color of all frames for selecting background color
-        for frame in self.frames_raw:
-            s = frame.shape
-            colors = frame.reshape((-1, s[2]))  # type: ignore
-            # Do not count in alpha=0
-            # If alpha > 0, use alpha as weight
-            colors = colors[colors[:, 3] != 0]
-            if colors.shape[0] != 0:
-                alphas = colors[:, 3] / 255
-                r_mean = cast(float, np.mean(colors[:, 0] * alphas))
-                g_mean = cast(float, np.mean(colors[:, 1] * alphas))
-                b_mean = cast(float, np.mean(colors[:, 2] * alphas))
-                mean_total += (r_mean + g_mean + b_mean) / 3
-
-        if mean_total / len(self.frames_raw) < 128:
+        # Do not count in alpha=0
+        # If alpha > 0, use alpha as weight
+        # Raw frames may be spilled to disk, so only one is loaded at a time
+        # Frames referring to the same frame are read once, weighted by count
+        frames_imported = self.frames_raw.imported()
+        sources = Counter(self.frames_raw.source(i) for i in frames_imported)
+        for i, count in sources.items():
+            mean_total += float(frames_color_mean(self.frames_raw[i])) * count
+
+        if mean_total / len(frames_imported) < 128:
             return (255, 255, 255, 0)
         else:
             return (0, 0, 0, 0)
 
     def frames_resize(
-        self, frames_in: "List[np.ndarray[Any, Any]]"
+        self,
+        frames_in: "List[np.ndarray[Any, Any]]",
+        bbox: Optional[Tuple[int, int, int, int]] = None,
     ) -> "List[np.ndarray[Any, Any]]":
-        frames_out: "List[np.ndarray[Any, Any]]" = []
-
         resample: Literal[0, 1, 2, 3, 4, 5]
         if self.opt_comp.scale_filter == "nearest":
             resample = Image.NEAREST
@@ -800,46 +1476,47 @@ class StickerConvert:
         if self.bg_color is None:
             self.bg_color = self.determine_bg_color()
 
-        for frame in frames_in:
-            with Image.fromarray(frame, "RGBA") as im:  # type: ignore
-                width, height = im.size
-
-            if self.res_w is None:
-                self.res_w = width
-            if self.res_h is None:
-                self.res_h = height
-
-            scaling = 1 - (self.opt_comp.padding_percent / 100)
-            if width / self.res_w > height / self.res_h:
-                width_new = int(self.res_w * scaling)
-                height_new = int(height * self.res_w / width * scaling)
-            else:
-                height_new = int(self.res_h * scaling)
-                width_new = int(width * self.res_h / height * scaling)
-
-            with im.resize((width_new, height_new), resample=resample) as im_resized:
-                with Image.new(
-                    "RGBA", (self.res_w, self.res_h), self.bg_color
-                ) as im_new:
-                    im_new.alpha_composite(
-                        im_resized,
-                        ((self.res_w - width_new) // 2, (self.res_h - height_new) // 2),
-                    )
-                    frames_out.append(np.asarray(im_new))
-
-        return frames_out
+        if not frames_in:
+            return []
+        size_orig: Optional[Tuple[int, int]] = None
+        if bbox is not None:
+            # Crop to (left, top, right, bottom), padding applies to what is left
+            left, top, right, bottom = bbox
+            frames_in = [frame[top:bottom, left:right] for frame in frames_in]
+        elif self.prescale_res is not None:
+            # Aspect ratio of prescaled frames is off by rounding
+            size_orig = self.codec_info_orig.res
+        width: int
+        height: int
+        width, height = size_orig or (frames_in[0].shape[1], frames_in[0].shape[0])
+        if self.res_w is None:
+            self.res_w = width
+        if self.res_h is None:
+            self.res_h = height
+
+        threads = self.opt_comp.decode_threads
+        if threads == 0:
+            threads = cpu_count()
+        resizer = FrameResizer(
+            (self.res_w, self.res_h),
+            self.bg_color,
+            resample,
+            self.opt_comp.padding_percent,
+            size_orig,
+            threads,
+        )
+        return list(resizer.resize(frames_in))
 
-    def frames_drop(
-        self, frames_in: "List[np.ndarray[Any, Any]]"
-    ) -> "List[np.ndarray[Any, Any]]":
+    def frames_drop_index(self, frames_count: int) -> List[int]:
+        # Index of input frames to keep
         if (
             not self.codec_info_orig.is_animated
             or not self.fps
-            or len(self.frames_processed) == 1
+            or sum(self.frames_hold) == 1
         ):
-            return [frames_in[0]]
+            return [0]
 
-        frames_out: "List[np.ndarray[Any, Any]]" = []
+        frames_out: List[int] = []
 
         # fps_ratio: 1 frame in new anim equal to how many frame in old anim
         # speed_ratio: How much to speed up / slow down
@@ -872,21 +1549,21 @@ class StickerConvert:
         frame_current = 0
         frame_current_float = 0.0
         while True:
-            if frame_current <= len(frames_in) - 1 and not (
+            if frame_current <= frames_count - 1 and not (
                 frames_out_max and len(frames_out) == frames_out_max
             ):
-                frames_out.append(frames_in[frame_current])
+                frames_out.append(frame_current)
             else:
                 while len(frames_out) == 0 or (
                     frames_out_min and len(frames_out) < frames_out_min
                 ):
-                    frames_out.append(frames_in[-1])
+                    frames_out.append(frames_count - 1)
                 return frames_out
             frame_current_float += frame_increment
             frame_current = int(rounding(frame_current_float))
 
     def frames_export(self) -> None:
-        is_animated = len(self.frames_processed) > 1 and self.fps
+        is_animated = sum(self.frames_hold) > 1 and self.fps
         if self.out_f.suffix in (".apng", ".png"):
             if is_animated:
                 self._frames_export_apng()
@@ -900,16 +1577,7 @@ class StickerConvert:
             self._frames_export_pil()
 
     def _check_dup(self) -> bool:
-        if len(self.frames_processed) == 1:
-            return False
-
-        prev_frame = self.frames_processed[0]
-        for frame in self.frames_processed[1:]:
-            if np.array_equal(frame, prev_frame):
-                return True
-            prev_frame = frame
-
-        return False
+        return self.frames_processed.has_dup()
 
     def _frames_export_pil(self) -> None:
         with Image.fromarray(self.frames_processed[0]) as im:  # type: ignore
@@ -961,13 +1629,47 @@ class StickerConvert:
             out_stream.height = self.res_h
             out_stream.pix_fmt = pixel_format
 
-            for frame in self.frames_processed:
+            # Held frames are encoded once, with pts skipping the frames held
+            # Last frame is repeated at end, or duration would be cut short
+            frames_out: "List[Tuple[np.ndarray[Any, Any], int]]" = []
+            pts = 0
+            for i, hold in self.get_frames_hold_capped():
+                frames_out.append((self.frames_processed[i], pts))
+                pts += hold
+            if frames_out and frames_out[-1][1] != pts - 1:
+                frames_out.append((self.frames_processed[-1], pts - 1))
+            pts_total = pts
+
+            # Matroska keeps timestamps in milliseconds and ends last frame
+            # after its duration rounded down, so fps measured from duration
+            # would exceed fps. Last frame is delayed to end at full duration.
+            pts_ms = self.out_f.suffix in (".webm", ".mkv")
+            if self.fps and pts_ms:
+                out_stream.codec_context.time_base = Fraction(1, 1000)
+
+            # Muxer may buffer before writing, so also abort on encoded size
+            packets_size = 0
+            for frame_index, (frame, pts) in enumerate(frames_out):
                 av_frame = av.VideoFrame.from_ndarray(frame, format="rgba")
-                output.mux(out_stream.encode(av_frame))  # type: ignore
+                if self.fps and pts_ms:
+                    if frame_index == len(frames_out) - 1:
+                        av_frame.pts = ceil(pts_total * 1000 / self.fps) - floor(
+                            1000 / self.fps
+                        )
+                    else:
+                        av_frame.pts = int(rounding(float(pts * 1000 / self.fps)))
+                    av_frame.time_base = Fraction(1, 1000)
+                elif self.fps:
+                    av_frame.pts = pts
+                    av_frame.time_base = 1 / self.fps
+                packets = out_stream.encode(av_frame)  # type: ignore
+                output.mux(packets)  # type: ignore
+                packets_size += sum(packet.size for packet in packets)  # type: ignore
+                self.tmp_f.check_size(packets_size)
             output.mux(out_stream.encode())  # type: ignore
 
         if self.duration_spoof and self.fps:
-            duration = len(self.frames_processed) / self.fps * 1000
+            duration = sum(self.frames_hold) / self.fps * 1000
             if self.opt_comp.duration_min and duration < self.opt_comp.duration_min:
                 fake_duration = self.opt_comp.duration_min
             elif self.opt_comp.duration_max and duration > self.opt_comp.duration_max:
@@ -980,6 +1682,19 @@ class StickerConvert:
             self.tmp_f.truncate(0)
             self.tmp_f.write(tmp_f_new)
 
+    def get_frames_hold_capped(self) -> List[Tuple[int, int]]:
+        # Index in frames_processed and hold of each frame to export
+        # fps of file is frames per duration, so frames are repeated if
+        # held for longer than fps_min allows
+        hold_max = max(1, sum(self.frames_hold))
+        if self.fps and self.opt_comp.fps_min:
+            hold_max = max(1, floor(self.fps / self.opt_comp.fps_min))
+        return [
+            (i, min(hold_max, hold - j))
+            for i, hold in enumerate(self.frames_hold)
+            for j in range(0, hold, hold_max)
+        ]
+
     def _frames_export_pil_anim(self) -> None:
         extra_kwargs: Dict[str, Any] = {}
 
@@ -998,22 +1713,23 @@ class StickerConvert:
             # Change lowest alpha to alpha=0
             # Only keep alpha=0 and alpha=255, nothing in between
             extra_kwargs["format"] = "GIF"
-            frames_processed = np.array(self.frames_processed)
-            alpha = frames_processed[:, :, :, 3]
-            alpha_min = np.min(alpha)  # type: ignore
-            if alpha_min < 255:
-                alpha[alpha > alpha_min] = 255
-                alpha[alpha == alpha_min] = 0
-
-            if 0 in alpha:
+            # Only alpha is replaced, frames_processed is shared by steps
+            alpha = self.frames_processed.alpha_binarized()
+            if alpha.min() == 0:
                 extra_kwargs["transparency"] = 0
                 extra_kwargs["disposal"] = 2
-                im_out = [self.quantize(Image.fromarray(i)) for i in frames_processed]  # type: ignore
+                im_in: List[Image.Image] = []
+                for frame, frame_alpha in zip(self.frames_processed, alpha):
+                    im = Image.fromarray(frame)  # type: ignore
+                    im.putalpha(Image.fromarray(frame_alpha))  # type: ignore
+                    im_in.append(im)
+                im_out = self.quantize_frames(im_in, "gif")
             else:
-                im_out = [
-                    self.quantize(Image.fromarray(i).convert("RGB")).convert("RGB")  # type: ignore
-                    for i in frames_processed
+                im_in = [
+                    Image.fromarray(i).convert("RGB")  # type: ignore
+                    for i in self.frames_processed
                 ]
+                im_out = [i.convert("RGB") for i in self.quantize_frames(im_in, "gif")]
         elif self.out_f.suffix == ".webp":
             im_out = [Image.fromarray(i) for i in self.frames_processed]  # type: ignore
             extra_kwargs["format"] = "WebP"
@@ -1028,9 +1744,13 @@ class StickerConvert:
             raise RuntimeError(I("Invalid format {}").format(self.out_f.suffix))
 
         if self.fps:
+            frames_hold = self.get_frames_hold_capped()
+            im_out = [im_out[i] for i, _ in frames_hold]
             extra_kwargs["save_all"] = True
             extra_kwargs["append_images"] = im_out[1:]
-            extra_kwargs["duration"] = int(1000 / self.fps)
+            extra_kwargs["duration"] = [
+                hold * int(1000 / self.fps) for _, hold in frames_hold
+            ]
             extra_kwargs["loop"] = 0
 
         im_out[0].save(
@@ -1041,7 +1761,7 @@ class StickerConvert:
 
     def _frames_export_png(self) -> None:
         with Image.fromarray(self.frames_processed[0], "RGBA") as image:  # type: ignore
-            image_quant = self.quantize(image)
+            image_quant = self.quantize(image, "png")
 
         with BytesIO() as f:
             image_quant.save(f, format="png")
@@ -1055,7 +1775,7 @@ class StickerConvert:
         assert self.fps
         assert self.res_h
 
-        frames_concat = np.concatenate(self.frames_processed)
+        frames_concat = self.frames_processed.concat()
         with Image.fromarray(frames_concat, "RGBA") as image_concat:  # type: ignore
             if image_concat.getextrema()[3][0] < 255:  # type: ignore
                 mode = "RGBA"
@@ -1063,22 +1783,23 @@ class StickerConvert:
             else:
                 mode = "RGB"
                 create_frame_method = create_frame_from_rgb
-            image_quant = self.quantize(image_concat)
+            image_quant = self.quantize(image_concat, "apng")
 
         if self.apngasm is None:
             self.apngasm = APNGAsm()  # type: ignore
         assert isinstance(self.apngasm, APNGAsm)
 
         delay_num = int(1000 / self.fps)
-        for i in range(0, image_quant.height, self.res_h):
-            crop_dimension = (0, i, image_quant.width, i + self.res_h)
+        for i, hold in self.get_frames_hold_capped():
+            top = i * self.res_h
+            crop_dimension = (0, top, image_quant.width, top + self.res_h)
             image_cropped = image_quant.crop(crop_dimension)
             image_final = image_cropped.convert(mode)
             frame_final = create_frame_method(
                 np.array(image_final),
                 width=image_final.width,
                 height=image_final.height,
-                delay_num=delay_num,
+                delay_num=hold * delay_num,
                 delay_den=1000,
             )
             self.apngasm.add_frame(frame_final)
@@ -1086,13 +1807,13 @@ class StickerConvert:
         with CacheStore.get_cache_store(path=self.opt_comp.cache_dir) as tempdir:
             tmp_apng = Path(tempdir, f"out{self.out_f.suffix}")
             self.apngasm.assemble(tmp_apng.as_posix())
+            # Frames must not leak into next step if write below is aborted
+            self.apngasm.reset()
 
             with open(tmp_apng, "rb") as f:
                 apng_optimized = self.optimize_png(f.read())
                 self.tmp_f.write(apng_optimized)
 
-        self.apngasm.reset()
-
     def optimize_png(self, image_bytes: bytes) -> bytes:
         import oxipng
 
@@ -1105,44 +1826,97 @@ class StickerConvert:
             strip=oxipng.StripChunks.safe(),
         )
 
-    def quantize(self, image: Image.Image) -> Image.Image:
+    def quantize(self, image: Image.Image, key: Hashable) -> Image.Image:
+        # key tells which image of frames_processed is quantized
         if not (self.color and self.color <= 256):
             return image.copy()
         if self.opt_comp.quantize_method == "imagequant":
-            return self._quantize_by_imagequant(image)
+            return self._quantize_by_imagequant(image, key)
         if self.opt_comp.quantize_method in ("mediancut", "maxcoverage", "fastoctree"):
-            return self._quantize_by_pillow(image)
+            return self._quantize_by_pillow(image, key)
 
         return image
 
-    def _quantize_by_imagequant(self, image: Image.Image) -> Image.Image:
-        import imagequant  # type: ignore
+    def quantize_frames(
+        self, images: List[Image.Image], key: Hashable
+    ) -> List[Image.Image]:
+        # Quantize frames of same size to one palette, instead of one each
+        if not (self.color and self.color <= 256) or len(images) <= 1:
+            return [self.quantize(im, (key, i)) for i, im in enumerate(images)]
+        if self.opt_comp.quantize_method == "imagequant":
+            return self._quantize_frames_by_imagequant(images, key)
+        if self.opt_comp.quantize_method in ("mediancut", "maxcoverage", "fastoctree"):
+            # Frames stacked vertically, as in _frames_export_apng()
+            width, height = images[0].size
+            with Image.fromarray(
+                np.concatenate([np.asarray(i) for i in images])
+            ) as image_concat:
+                image_quant = self._quantize_by_pillow(image_concat, key)
+            return [
+                image_quant.crop((0, i, width, i + height))
+                for i in range(0, image_quant.height, height)
+            ]
+
+        return images
 
+    def _quantize_frames_by_imagequant(
+        self, images: List[Image.Image], key: Hashable
+    ) -> List[Image.Image]:
         assert isinstance(self.quality, int)
         assert isinstance(self.opt_comp.quality_min, int)
-        assert isinstance(self.opt_comp.quality_max, int)
         assert isinstance(self.color, int)
 
-        dither = 1 - (self.quality - self.opt_comp.quality_min) / (
+        try:
+            palettes = self.quantize_cache.get_palettes((self.frames_key, key), images)
+            images_quant = quantize_imagequant_frames(
+                palettes,
+                max_colors=self.color,
+                max_quality=self.quality,
+                dithering_level=self.get_dither(),
+                min_quality=self.opt_comp.quality_min,
+            )
+        except RuntimeError:
+            return [self.quantize(im, (key, i)) for i, im in enumerate(images)]
+        # Frames not fitting shared palette fallback to palette of their own
+        return [
+            self.quantize(image, (key, i)) if image_quant is None else image_quant
+            for i, (image, image_quant) in enumerate(zip(images, images_quant))
+        ]
+
+    def get_dither(self) -> float:
+        # Dither more at lower quality
+        assert isinstance(self.quality, int)
+        assert isinstance(self.opt_comp.quality_min, int)
+        assert isinstance(self.opt_comp.quality_max, int)
+
+        return 1 - (self.quality - self.opt_comp.quality_min) / (
             self.opt_comp.quality_max - self.opt_comp.quality_min
         )
-        image_quant = None
-        for i in range(self.quality, 101, 5):
-            try:
-                image_quant = imagequant.quantize_pil_image(  # type: ignore
-                    image,
-                    dithering_level=dither,
-                    max_colors=self.color,
-                    min_quality=self.opt_comp.quality_min,
-                    max_quality=i,
-                )
-                return image_quant
-            except RuntimeError:
-                pass
 
-        return image
+    def _quantize_by_imagequant(self, image: Image.Image, key: Hashable) -> Image.Image:
+        assert isinstance(self.quality, int)
+        assert isinstance(self.opt_comp.quality_min, int)
+        assert isinstance(self.color, int)
+
+        # Single attempt, achieved quality is checked instead of retrying
+        # with higher max_quality until libimagequant stops raising
+        # Palette of same image and color is remapped if only quality changes
+        try:
+            palettes = self.quantize_cache.get_palettes((self.frames_key, key), [image])
+            image_quant, quality = quantize_imagequant(
+                palettes,
+                max_colors=self.color,
+                max_quality=self.quality,
+                dithering_level=self.get_dither(),
+            )
+        except RuntimeError:
+            return image
+        if quality < self.opt_comp.quality_min:
+            return image
+
+        return image_quant
 
-    def _quantize_by_pillow(self, image: Image.Image) -> Image.Image:
+    def _quantize_by_pillow(self, image: Image.Image, key: Hashable) -> Image.Image:
         assert self.color
 
         if image.mode == "RGBA" and self.opt_comp.quantize_method in (
@@ -1157,7 +1931,14 @@ class StickerConvert:
             method = Image.Quantize.MAXCOVERAGE
         else:
             method = Image.Quantize.FASTOCTREE
-        return image.quantize(colors=self.color, method=method)
+
+        # Pillow ignores quality, so steps that only change quality reuse palette
+        cache_key = (self.frames_key, key, self.color, method)
+        image_quant = self.quantize_cache.get_image(cache_key)
+        if image_quant is None:
+            image_quant = image.quantize(colors=self.color, method=method)
+            self.quantize_cache.put_image(cache_key, image_quant)
+        return image_quant
 
     def fix_fps(self, fps: float) -> Fraction:
         # After rounding fps/duration during export,
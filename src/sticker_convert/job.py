@@ -4,15 +4,18 @@ from __future__ import annotations
 import os
 import shutil
 import traceback
+from copy import copy
 from datetime import datetime
-from multiprocessing import Manager, Process, Value
+from multiprocessing import Manager, Process, Value, cpu_count
 from pathlib import Path
 from threading import Thread
 from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union, cast
 
+import psutil
+
 from sticker_convert.definitions import RUNTIME_STATE
-from sticker_convert.job_option import CompOption, CredOption, InputOption, OutputOption
-from sticker_convert.utils.callback import CallbackReturn, CbQueueType, ResultsListType, WorkQueueType
+from sticker_convert.job_option import SEARCH_METHODS, CompOption, CredOption, InputOption, OutputOption
+from sticker_convert.utils.callback import CallbackReturn, CbQueueType, ResultsListType, StepHintsType, WorkQueueType
 from sticker_convert.utils.files.json_resources_loader import load_resource_json
 from sticker_convert.utils.translate import I
 
@@ -34,6 +37,8 @@ class Executor:
         self.cb_queue: CbQueueType = self.manager.Queue()
         self.results_list: ResultsListType = self.manager.list()
         self.cb_return = CallbackReturn(self.manager)
+        # Converged compression steps, shared between workers
+        self.step_hints: StepHintsType = self.manager.dict()
         self.processes: List[Process] = []
 
         self.is_cancel_job = Value("i", 0)
@@ -101,8 +106,12 @@ class Executor:
         results_list: ResultsListType,
         cb_queue: CbQueueType,
         cb_return: CallbackReturn,
+        step_hints: StepHintsType,
     ) -> None:
         from sticker_convert.utils.chrome_remotedebug import CRD
+        from sticker_convert.utils.media.svg_renderer import SvgRenderer
+
+        RUNTIME_STATE["step_hints"] = step_hints
 
         for work_func, work_args in iter(work_queue.get, None):
             try:
@@ -130,6 +139,9 @@ class Executor:
 
         work_queue.put(None)
         cb_queue.put("__PROCESS_DONE__")
+        svg_renderer = cast(SvgRenderer, RUNTIME_STATE.get("svg_renderer"))
+        if svg_renderer:
+            svg_renderer.close()
         crd = cast(CRD, RUNTIME_STATE.get("crd"))
         if crd:
             crd.close()
@@ -152,6 +164,7 @@ class Executor:
                     self.results_list,
                     self.cb_queue,
                     self.cb_return,
+                    self.step_hints,
                 ),
                 daemon=True,
             )
@@ -397,6 +410,23 @@ class Job:
                             f"    Using {metadata} provided by input source\n"
                         ).format(metadata=metadata)
 
+        if (self.opt_comp.merge_min is None) != (self.opt_comp.merge_max is None):
+            error_msg += I(
+                "[X] merge_min and merge_max should be set together\n"
+                "    merge_min={merge_min} and merge_max={merge_max} were given\n"
+            ).format(
+                merge_min=self.opt_comp.merge_min, merge_max=self.opt_comp.merge_max
+            )
+
+        if self.opt_comp.search_method not in SEARCH_METHODS:
+            error_msg += I(
+                "[X] search_method {search_method} is not valid option\n"
+                "    Valid options: {search_methods}\n"
+            ).format(
+                search_method=self.opt_comp.search_method,
+                search_methods=", ".join(SEARCH_METHODS),
+            )
+
         if info_msg != "":
             self.executor.cb(info_msg)
 
@@ -742,14 +772,26 @@ class Job:
             "bar", kwargs={"set_progress_mode": "determinate", "steps": in_fs_count}
         )
 
-        self.executor.start_workers(processes=min(self.opt_comp.processes, in_fs_count))
+        processes = min(self.opt_comp.processes, in_fs_count)
+        opt_comp = copy(self.opt_comp)
+        if opt_comp.parallel_steps == 0:
+            # Give cores that processes would leave idle to parallel steps
+            opt_comp.parallel_steps = max(1, self.opt_comp.processes // processes)
+        if opt_comp.frame_mem_limit == 0:
+            # Leave half of available memory for encoders and other programs
+            mem_available = psutil.virtual_memory().available // 1024 // 1024
+            opt_comp.frame_mem_limit = max(256, mem_available // 2 // processes)
+        if opt_comp.decode_threads == 0:
+            opt_comp.decode_threads = max(1, cpu_count() // processes)
+
+        self.executor.start_workers(processes=processes)
 
         for i in in_fs:
             in_f = input_dir / i.name
             out_f = output_dir / Path(i).stem
 
             self.executor.add_work(
-                work_func=StickerConvert.convert, work_args=(in_f, out_f, self.opt_comp)
+                work_func=StickerConvert.convert, work_args=(in_f, out_f, opt_comp)
             )
 
         self.executor.join_workers()
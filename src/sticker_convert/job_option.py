@@ -8,6 +8,9 @@ from multiprocessing import cpu_count
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple, Union
 
+# Valid values of CompOption.search_method
+SEARCH_METHODS = ("steps", "multidim")
+
 
 def to_int(i: Union[float, str, None]) -> Optional[int]:
     return int(i) if i is not None else None
@@ -65,6 +68,10 @@ class CompOption(BaseOption):
     color_max: Optional[int] = None
     color_power: float = 3.0
 
+    merge_min: Optional[int] = None
+    merge_max: Optional[int] = None
+    merge_power: float = 1.0
+
     duration_min: Optional[int] = None
     duration_max: Optional[int] = None
     duration_spoof: bool = False
@@ -74,6 +81,9 @@ class CompOption(BaseOption):
     padding_percent: int = 0
 
     steps: int = 1
+    search_method: str = "steps"
+    search_budget: int = 0
+    estimate_margin: float = 0.0
     fake_vid: Optional[bool] = None
     quantize_method: Optional[str] = None
     scale_filter: Optional[str] = None
@@ -82,8 +92,21 @@ class CompOption(BaseOption):
     default_emoji: str = "😀"
     no_compress: Optional[bool] = None
     processes: int = ceil(cpu_count() / 2)
+    parallel_steps: int = 0
+    frame_mem_limit: int = 0
+    decode_threads: int = 0
+    prescale: bool = True
+    auto_trim: bool = False
+    yuva_swscale: bool = False
     animated: Optional[bool] = None
 
+    def __post_init__(self) -> None:
+        if self.search_method not in SEARCH_METHODS:
+            raise ValueError(
+                f"search_method {self.search_method} is not valid option, "
+                f"valid options: {', '.join(SEARCH_METHODS)}"
+            )
+
     def to_dict(self) -> Dict[Any, Any]:
         return {
             "preset": self.preset,
@@ -106,12 +129,20 @@ class CompOption(BaseOption):
                 "max": self.color_max,
                 "power": self.color_power,
             },
+            "merge": {
+                "min": self.merge_min,
+                "max": self.merge_max,
+                "power": self.merge_power,
+            },
             "duration": {
                 "min": self.duration_min,
                 "max": self.duration_max,
                 "spoof": self.duration_spoof,
             },
             "steps": self.steps,
+            "search_method": self.search_method,
+            "search_budget": self.search_budget,
+            "estimate_margin": self.estimate_margin,
             "bg_color": self.bg_color,
             "padding_percent": self.padding_percent,
             "fake_vid": self.fake_vid,
@@ -122,6 +153,12 @@ class CompOption(BaseOption):
             "default_emoji": self.default_emoji,
             "no_compress": self.no_compress,
             "processes": self.processes,
+            "parallel_steps": self.parallel_steps,
+            "frame_mem_limit": self.frame_mem_limit,
+            "decode_threads": self.decode_threads,
+            "prescale": self.prescale,
+            "auto_trim": self.auto_trim,
+            "yuva_swscale": self.yuva_swscale,
             "animated": self.animated,
         }
 
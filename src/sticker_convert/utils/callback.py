@@ -2,7 +2,7 @@
 from functools import partial
 from getpass import getpass
 from multiprocessing import Event, Manager
-from multiprocessing.managers import ListProxy, SyncManager
+from multiprocessing.managers import DictProxy, ListProxy, SyncManager
 from queue import Queue
 from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Protocol, Tuple, Union
 
@@ -19,6 +19,7 @@ if TYPE_CHECKING:
     ResponseListType = ListProxy[ResponseItemType]  # type: ignore
     CbQueueType = Queue[CbQueueItemType]  # type: ignore
     WorkQueueType = Queue[WorkQueueItemType]  # type: ignore
+    StepHintsType = DictProxy[Tuple[Any, ...], int]  # type: ignore
     from ttkbootstrap import Toplevel  # type: ignore
 
     from sticker_convert.gui import GUI  # type: ignore
@@ -27,6 +28,7 @@ else:
     ResponseListType = List[ResponseItemType]
     CbQueueType = Queue
     WorkQueueType = Queue
+    StepHintsType = Dict[Tuple[Any, ...], int]
 
 
 class CallbackReturn:
@@ -9,6 +9,7 @@ import signal
 import socket
 import subprocess
 import time
+from copy import copy
 from typing import Any, Dict, List, Optional, Union, cast
 
 import requests
@@ -58,6 +59,8 @@ class CRD:
         if port is None:
             port = get_free_port()
         self.port = port
+        # Id of tab opened by new_tab()
+        self.tab_id: Optional[str] = None
 
         launch_cmd: List[str] = []
         if (
@@ -149,6 +152,22 @@ class CRD:
     def disconnect(self) -> None:
         self.ws.close()
 
+    def new_tab(self) -> "CRD":
+        # Connection to a new tab of same browser, for use by another thread
+        r = requests.put(f"http://127.0.0.1:{self.port}/json/new?about:blank")
+        target = json.loads(r.text)
+        tab = copy(self)
+        tab.cmd_id = 1
+        tab.tab_id = target["id"]
+        tab.ws = websocket.create_connection(  # type: ignore
+            target["webSocketDebuggerUrl"]
+        )
+        return tab
+
+    def close_tab(self) -> None:
+        self.ws.close()
+        requests.get(f"http://127.0.0.1:{self.port}/json/close/{self.tab_id}")
+
     def send_cmd(self, command: Dict[Any, Any]) -> Union[str, bytes]:
         if command.get("id") is None:
             command["id"] = self.cmd_id
@@ -163,15 +182,37 @@ class CRD:
 
         raise RuntimeError(I("Websocket keep disconnecting"))
 
-    def exec_js(self, js: str, context_id: Optional[int] = None) -> Union[str, bytes]:
+    def send_cmds(self, commands: List[Dict[Any, Any]]) -> List[Union[str, bytes]]:
+        # Send all commands before receiving any response, to save round-trips
+        # Commands are executed in order by browser
+        ids: List[int] = []
+        for command in commands:
+            command["id"] = self.cmd_id
+            ids.append(self.cmd_id)
+            self.cmd_id += 1
+            self.ws.send(json.dumps(command))
+
+        results: Dict[int, Union[str, bytes]] = {}
+        while len(results) < len(ids):
+            r = self.ws.recv()
+            # Events have no id
+            cmd_id = json.loads(r).get("id")
+            if cmd_id in ids:
+                results[cmd_id] = r
+        return [results[i] for i in ids]
+
+    @staticmethod
+    def exec_js_cmd(js: str, context_id: Optional[int] = None) -> Dict[str, Any]:
         command: Dict[str, Any] = {
-            "id": self.cmd_id,
             "method": "Runtime.evaluate",
             "params": {"expression": js},
         }
         if context_id is not None:
             command["params"]["contextId"] = context_id
-        return self.send_cmd(command)
+        return command
+
+    def exec_js(self, js: str, context_id: Optional[int] = None) -> Union[str, bytes]:
+        return self.send_cmd(self.exec_js_cmd(js, context_id))
 
     def get_storage(self, key: str) -> Optional[str]:
         self.exec_js("window.dispatchEvent(new Event('localStorageUpdate'))")
@@ -198,19 +239,25 @@ class CRD:
         }
         return self.send_cmd(command)
 
-    def screenshot(self, clip: Optional[Dict[str, int]] = None) -> Image.Image:
+    @staticmethod
+    def screenshot_cmd(clip: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
         command: Dict[str, Any] = {
-            "id": self.cmd_id,
             "method": "Page.captureScreenshot",
             "params": {"captureBeyondViewport": True, "optimizeForSpeed": True},
         }
         if clip:
             command["params"]["clip"] = clip
-        result = self.send_cmd(command)
+        return command
+
+    @staticmethod
+    def screenshot_image(result: Union[str, bytes]) -> Image.Image:
         return Image.open(
             io.BytesIO(base64.b64decode(json.loads(result)["result"]["data"]))
         )
 
+    def screenshot(self, clip: Optional[Dict[str, int]] = None) -> Image.Image:
+        return self.screenshot_image(self.send_cmd(self.screenshot_cmd(clip)))
+
     def get_curr_url(self) -> str:
         r = self.exec_js("window.location.href")
         return cast(
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import io
+import mmap
+from typing import Any, Union
+
+# Input file held in memory, read without copying it
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+def buffer_size(buffer: Buffer) -> int:
+    # Size in bytes, as len() of memoryview counts items of its format
+    with memoryview(buffer) as view:
+        return view.nbytes
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Read-only file object over a Buffer, for libraries that need a file
+    object. Unlike BytesIO, a memoryview or mmap is not copied, and reads
+    only copy the bytes asked for.
+    """
+
+    def __init__(self, buffer: Buffer) -> None:
+        super().__init__()
+        self.buffer_view = memoryview(buffer)
+        self.view = self.buffer_view.cast("B")
+        self.pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        with memoryview(buffer) as buffer_view, buffer_view.cast("B") as target:
+            size = min(target.nbytes, len(self.view) - self.pos)
+            if size <= 0:
+                return 0
+            target[:size] = self.view[self.pos : self.pos + size]
+        self.pos += size
+        return size
+
+    def readall(self) -> bytes:
+        data = self.view[self.pos :].tobytes()
+        self.pos = len(self.view)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self.view) + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self.pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def getbuffer(self) -> memoryview:
+        return self.view
+
+    def close(self) -> None:
+        # mmap cannot be closed while views of it are not released
+        if not self.closed:
+            self.view.release()
+            self.buffer_view.release()
+        super().close()
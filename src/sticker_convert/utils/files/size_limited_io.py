@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+from io import BytesIO
+from typing import Any, Optional
+
+
+class SizeLimitExceeded(Exception):
+    def __init__(self, size: int) -> None:
+        super().__init__(f"Size {size} exceeded limit")
+        self.size = size
+
+
+class SizeLimitedBytesIO(BytesIO):
+    """
+    BytesIO that raises SizeLimitExceeded once data written to it
+    goes beyond size_limit, for aborting encodes early.
+    """
+
+    def __init__(self, size_limit: Optional[int] = None) -> None:
+        super().__init__()
+        self.size_limit = size_limit
+
+    def write(self, buffer: Any) -> int:
+        written = super().write(buffer)
+        self.check_size(self.tell())
+        return written
+
+    def check_size(self, size: int) -> None:
+        # size could also be a lower bound of final size known by caller
+        if self.size_limit and size > self.size_limit:
+            raise SizeLimitExceeded(size)
@@ -1,21 +1,24 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import json
 import mmap
+import re
+from contextlib import contextmanager
 from decimal import ROUND_HALF_UP, Decimal
 from fractions import Fraction
-from io import BytesIO
 from math import ceil, gcd
 from pathlib import Path
-from typing import BinaryIO, List, Optional, Tuple, Union, cast
+from typing import BinaryIO, Generator, List, Optional, Tuple, Union, cast
 
 from PIL import Image, UnidentifiedImageError
 from rlottie_python.rlottie_wrapper import LottieAnimation
 
 from sticker_convert.definitions import SVG_DEFAULT_HEIGHT, SVG_DEFAULT_WIDTH, SVG_SAMPLE_FPS
+from sticker_convert.utils.files.buffer_reader import Buffer, BufferReader
 from sticker_convert.utils.media.format_detect import format_detect
 
+ANMF_PATTERN = re.compile(b"ANMF")
+
 
 def lcm(a: int, b: int) -> int:
     return abs(a * b) // gcd(a, b)
@@ -66,7 +69,7 @@ def durations_gcd(*durations: Union[int, float]) -> Union[float, Fraction]:
         return Fraction(gcd(*durations), 1)  # type: ignore
 
 
-def open_lottie(file: Union[Path, bytes]) -> LottieAnimation:
+def open_lottie(file: Union[Path, Buffer]) -> LottieAnimation:
     if isinstance(file, Path):
         if file.suffix == ".tgs":
             return LottieAnimation.from_tgs(file.as_posix())
@@ -83,7 +86,7 @@ def open_lottie(file: Union[Path, bytes]) -> LottieAnimation:
         import gzip
 
         try:
-            with gzip.open(BytesIO(file)) as f:
+            with BufferReader(file) as file_ref, gzip.open(file_ref) as f:
                 data = f.read().decode(encoding="utf-8")
                 return LottieAnimation.from_data(data)
         except gzip.BadGzipFile:
@@ -92,19 +95,20 @@ def open_lottie(file: Union[Path, bytes]) -> LottieAnimation:
         import zipfile
 
         try:
-            with zipfile.ZipFile(BytesIO(file), "r") as zip_f:
+            with BufferReader(file) as file_ref, zipfile.ZipFile(
+                file_ref, "r"
+            ) as zip_f:
                 data = zip_f.read("animation/animation.json").decode("utf-8")
                 return LottieAnimation.from_data(data)
         except zipfile.BadZipFile:
             pass
 
-        data = json.loads(file.decode())
-        return LottieAnimation.from_data(data)
+        return LottieAnimation.from_data(str(file, "utf-8"))
 
 
 class CodecInfo:
     def __init__(
-        self, file: Union[Path, bytes], file_ext: Optional[str] = None
+        self, file: Union[Path, Buffer], file_ext: Optional[str] = None
     ) -> None:
         self.file_ext: Optional[str]
         if file_ext is None and isinstance(file, Path):
@@ -118,15 +122,15 @@ class CodecInfo:
             self.codec = "svg"
         else:
             self.fps, self.frames, self.duration = (
-                CodecInfo.get_file_fps_frames_duration(file)
+                CodecInfo.get_file_fps_frames_duration(file, self.file_ext)
             )
-            self.codec = CodecInfo.get_file_codec(file)
-            self.res = CodecInfo.get_file_res(file)
+            self.codec = CodecInfo.get_file_codec(file, self.file_ext)
+            self.res = CodecInfo.get_file_res(file, self.file_ext)
         self.is_animated = self.fps > 1
 
     @staticmethod
     def get_file_fps_frames_duration(
-        file: Union[Path, bytes], file_ext: Optional[str] = None
+        file: Union[Path, Buffer], file_ext: Optional[str] = None
     ) -> Tuple[float, int, int]:
         fps: float
         duration: int
@@ -159,7 +163,9 @@ class CodecInfo:
         return fps, frames, duration
 
     @staticmethod
-    def get_file_fps(file: Union[Path, bytes], file_ext: Optional[str] = None) -> float:
+    def get_file_fps(
+        file: Union[Path, Buffer], file_ext: Optional[str] = None
+    ) -> float:
         if not file_ext and isinstance(file, Path):
             file_ext = CodecInfo.get_file_ext(file)
 
@@ -184,7 +190,7 @@ class CodecInfo:
 
     @staticmethod
     def get_file_frames(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         file_ext: Optional[str] = None,
         check_anim: bool = False,
     ) -> int:
@@ -214,7 +220,7 @@ class CodecInfo:
 
     @staticmethod
     def get_file_duration(
-        file: Union[Path, bytes], file_ext: Optional[str] = None
+        file: Union[Path, Buffer], file_ext: Optional[str] = None
     ) -> int:
         duration: int
 
@@ -240,21 +246,21 @@ class CodecInfo:
         return duration
 
     @staticmethod
-    def _get_file_fps_lottie(file: Union[Path, bytes]) -> int:
+    def _get_file_fps_lottie(file: Union[Path, Buffer]) -> int:
         anim = open_lottie(file)
         fps = anim.lottie_animation_get_framerate()
 
         return fps
 
     @staticmethod
-    def _get_file_frames_lottie(file: Union[Path, bytes]) -> int:
+    def _get_file_frames_lottie(file: Union[Path, Buffer]) -> int:
         anim = open_lottie(file)
         frames = anim.lottie_animation_get_totalframe()
 
         return frames
 
     @staticmethod
-    def _get_file_fps_frames_lottie(file: Union[Path, bytes]) -> Tuple[int, int]:
+    def _get_file_fps_frames_lottie(file: Union[Path, Buffer]) -> Tuple[int, int]:
         anim = open_lottie(file)
         fps = anim.lottie_animation_get_framerate()
         frames = anim.lottie_animation_get_totalframe()
@@ -264,12 +270,12 @@ class CodecInfo:
 
     @staticmethod
     def _get_file_fps_frames_duration_pillow(
-        file: Union[Path, bytes], frames_only: bool = False
+        file: Union[Path, Buffer], frames_only: bool = False
     ) -> Tuple[float, int, int]:
         total_duration = 0
         durations: List[int] = []
 
-        with Image.open(file) as im:
+        with CodecInfo.open_file(file) as file_ref, Image.open(file_ref) as im:
             if "n_frames" in dir(im):
                 frames = im.n_frames
                 if frames_only is True:
@@ -294,35 +300,37 @@ class CodecInfo:
 
     @staticmethod
     def _get_file_fps_frames_duration_webp(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
     ) -> Tuple[float, int, int, List[int]]:
         total_duration = 0
         frames = 0
         durations: List[int] = []
         durations_unique: List[int] = []
 
-        def _open_f(file: Union[Path, bytes]) -> BinaryIO:
-            if isinstance(file, Path):
-                return open(file, "r+b")
-            return BytesIO(file)
-
-        with _open_f(file) as f:
-            with mmap.mmap(f.fileno(), 0) as mm:
-                while True:
-                    anmf_pos = mm.find(b"ANMF")
-                    if anmf_pos == -1:
-                        break
-                    mm.seek(anmf_pos + 20)
-                    frame_duration_32 = mm.read(4)
-                    frame_duration_bytes = frame_duration_32[:-1] + bytes(
-                        int(frame_duration_32[-1]) & 0b11111100
-                    )
-                    frame_duration = int.from_bytes(frame_duration_bytes, "little")
-                    if frame_duration not in durations_unique and frame_duration != 0:
-                        durations_unique.append(frame_duration)
-                    durations.append(frame_duration)
-                    total_duration += frame_duration
-                    frames += 1
+        def _scan(buffer: Buffer) -> None:
+            nonlocal total_duration, frames
+            pos = 0
+            while True:
+                anmf = ANMF_PATTERN.search(buffer, pos)  # type: ignore
+                if anmf is None:
+                    break
+                # Frame duration is 24 bits, after offset, width and height
+                pos = anmf.start() + 20
+                frame_duration = int.from_bytes(buffer[pos : pos + 3], "little")
+                pos += 4
+                if frame_duration not in durations_unique and frame_duration != 0:
+                    durations_unique.append(frame_duration)
+                durations.append(frame_duration)
+                total_duration += frame_duration
+                frames += 1
+
+        if isinstance(file, Path):
+            with open(file, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    _scan(mm)
+        else:
+            with memoryview(file) as view, view.cast("B") as view_bytes:
+                _scan(view_bytes)
 
         if frames <= 1:
             return 0.0, 1, 0, durations
@@ -338,7 +346,7 @@ class CodecInfo:
 
     @staticmethod
     def _get_file_frames_duration_av(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         frames_to_iterate: Optional[int] = None,
         frames_only: bool = False,
     ) -> Tuple[int, int]:
@@ -350,13 +358,7 @@ class CodecInfo:
         # duration could be spoofed
         # https://github.com/sliva0/tgradish/blob/master/src/tgradish/spoofer.py
 
-        file_ref: Union[str, BinaryIO]
-        if isinstance(file, Path):
-            file_ref = file.as_posix()
-        else:
-            file_ref = BytesIO(file)
-
-        with av.open(file_ref) as container:
+        with CodecInfo.open_file(file) as file_ref, av.open(file_ref) as container:
             container = cast(InputContainer, container)
             stream = container.streams.video[0]
             if frames_only is True and stream.frames > 1:
@@ -383,22 +385,18 @@ class CodecInfo:
             return frame_count, int(rounding(float(duration)))
 
     @staticmethod
-    def get_file_codec(file: Union[Path, bytes], file_ext: Optional[str] = None) -> str:
+    def get_file_codec(
+        file: Union[Path, Buffer], file_ext: Optional[str] = None
+    ) -> str:
         if not file_ext and isinstance(file, Path):
             file_ext = CodecInfo.get_file_ext(file)
 
-        file_ref: Union[str, BinaryIO]
-        if isinstance(file, Path):
-            file_ref = file.as_posix()
-        else:
-            file_ref = BytesIO(file)
-
         codec = None
         animated = False
         if file_ext in (".tgs", ".lottie", ".lot", ".was", ".json", ".svg"):
             return file_ext.replace(".", "")
         try:
-            with Image.open(file) as im:
+            with CodecInfo.open_file(file) as file_ref, Image.open(file_ref) as im:
                 codec = im.format
                 if "is_animated" in dir(im):
                     animated = im.is_animated
@@ -419,7 +417,7 @@ class CodecInfo:
         from av.error import InvalidDataError
 
         try:
-            with av.open(file_ref) as container:
+            with CodecInfo.open_file(file) as file_ref, av.open(file_ref) as container:
                 return container.streams.video[0].codec_context.name.lower()
         except InvalidDataError:
             pass
@@ -428,7 +426,7 @@ class CodecInfo:
 
     @staticmethod
     def get_file_res(
-        file: Union[Path, bytes], file_ext: Optional[str] = None
+        file: Union[Path, Buffer], file_ext: Optional[str] = None
     ) -> Tuple[int, int]:
         if not file_ext and isinstance(file, Path):
             file_ext = CodecInfo.get_file_ext(file)
@@ -438,7 +436,7 @@ class CodecInfo:
             width, height = anim.lottie_animation_get_size()
             anim.lottie_animation_destroy()
         elif file_ext in (".webp", ".png", ".apng"):
-            with Image.open(file) as im:
+            with CodecInfo.open_file(file) as file_ref, Image.open(file_ref) as im:
                 width = im.width
                 height = im.height
         elif file_ext == ".svg":
@@ -447,19 +445,26 @@ class CodecInfo:
         else:
             import av
 
-            file_ref: Union[str, BinaryIO]
-            if isinstance(file, Path):
-                file_ref = file.as_posix()
-            else:
-                file_ref = BytesIO(file)
-
-            with av.open(file_ref) as container:
+            with CodecInfo.open_file(file) as file_ref, av.open(file_ref) as container:
                 stream = container.streams.video[0]
                 width = stream.width
                 height = stream.height
 
         return width, height
 
+    @staticmethod
+    @contextmanager
+    def open_file(
+        file: Union[Path, Buffer],
+    ) -> Generator[Union[str, BinaryIO], None, None]:
+        # Path, or file object reading Buffer without copying it
+        # File object is closed afterwards, so that Buffer is not held by it
+        if isinstance(file, Path):
+            yield file.as_posix()
+        else:
+            with BufferReader(file) as f:
+                yield cast(BinaryIO, f)
+
     @staticmethod
     def get_file_ext(file: Path) -> str:
         ext = Path(file).suffix.lower()
@@ -468,14 +473,14 @@ class CodecInfo:
         return format_detect(file)
 
     @staticmethod
-    def is_anim(file: Union[Path, bytes]) -> bool:
+    def is_anim(file: Union[Path, Buffer]) -> bool:
         if CodecInfo.get_file_frames(file, check_anim=True) > 1:
             return True
         return False
 
     @staticmethod
     def get_svg_info(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
     ) -> Tuple[float, int, int, Tuple[int, int]]:
         import warnings
 
@@ -487,7 +492,7 @@ class CodecInfo:
             with open(file) as f:
                 svg = f.read()
         else:
-            svg = file.decode()
+            svg = str(file, "utf-8")
 
         soup = BeautifulSoup(svg, "html.parser")
         svg_tag = soup.find_all("svg")[0]
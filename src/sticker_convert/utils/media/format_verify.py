@@ -5,12 +5,13 @@ from pathlib import Path
 from typing import Optional, Tuple, Union
 
 from sticker_convert.job_option import CompOption
+from sticker_convert.utils.files.buffer_reader import Buffer, buffer_size
 from sticker_convert.utils.media.codec_info import CodecInfo
 
 
 class FormatVerify:
     @staticmethod
-    def check_file(file: Union[Path, bytes], spec: CompOption) -> bool:
+    def check_file(file: Union[Path, Buffer], spec: CompOption) -> bool:
         if FormatVerify.check_presence(file) is False:
             return False
 
@@ -36,14 +37,14 @@ class FormatVerify:
         )
 
     @staticmethod
-    def check_presence(file: Union[Path, bytes]) -> bool:
+    def check_presence(file: Union[Path, Buffer]) -> bool:
         if isinstance(file, Path):
             return Path(file).is_file()
         return True
 
     @staticmethod
     def check_file_res(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         res: Tuple[
             Tuple[Optional[int], Optional[int]], Tuple[Optional[int], Optional[int]]
         ],
@@ -89,7 +90,7 @@ class FormatVerify:
 
     @staticmethod
     def check_file_fps(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         fps: Tuple[Optional[int], Optional[int]],
         file_info: Optional[CodecInfo] = None,
     ) -> bool:
@@ -107,7 +108,7 @@ class FormatVerify:
 
     @staticmethod
     def check_file_duration(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         duration: Tuple[Optional[int], Optional[int]],
         file_info: Optional[CodecInfo] = None,
     ) -> bool:
@@ -127,14 +128,14 @@ class FormatVerify:
 
     @staticmethod
     def check_file_size(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         size: Tuple[Optional[int], Optional[int]],
         file_info: Optional[CodecInfo] = None,
     ) -> bool:
         if isinstance(file, Path):
             file_size = os.path.getsize(file)
         else:
-            file_size = len(file)
+            file_size = buffer_size(file)
 
         if file_info:
             file_animated = file_info.is_animated
@@ -156,7 +157,7 @@ class FormatVerify:
 
     @staticmethod
     def check_animated(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         animated: Optional[bool] = None,
         file_info: Optional[CodecInfo] = None,
     ) -> bool:
@@ -172,7 +173,7 @@ class FormatVerify:
 
     @staticmethod
     def check_format(
-        file: Union[Path, bytes],
+        file: Union[Path, Buffer],
         fmt: Tuple[Tuple[str, ...], Tuple[str, ...]],
         file_info: Optional[CodecInfo] = None,
     ) -> bool:
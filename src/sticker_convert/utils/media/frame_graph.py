@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+from fractions import Fraction
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, cast
+
+if TYPE_CHECKING:
+    from av.filter import FilterContext, Graph
+    from av.video.frame import VideoFrame
+
+
+class FrameGraph:
+    """
+    Filter graph that pads frames to even width and height, or scales them
+    to size if given, then converts them to pix_fmt in the same pass.
+
+    The graph is configured on first frame and reused for following frames,
+    until frame size, format or pix_fmt changes.
+    """
+
+    def __init__(
+        self, time_base: Optional[Fraction], size: Optional[Tuple[int, int]] = None
+    ) -> None:
+        self.time_base = time_base if time_base else Fraction(1, 1000)
+        # Should be even for yuv420p and yuva420p
+        self.size = size
+        self.graph: "Optional[Graph]" = None
+        self.input_key: Optional[Tuple[Any, ...]] = None
+
+    def _configure(self, frame: "VideoFrame", pix_fmt: str) -> None:
+        from av.filter import Graph
+
+        graph = Graph()
+        in_src = graph.add_buffer(
+            width=frame.width,
+            height=frame.height,
+            format=frame.format,
+            time_base=self.time_base,
+        )
+        # Same matrix and range as reformat(format="yuva420p", dst_colorspace=1),
+        # as yuva420p frames are converted to RGBA with BT.709 matrix
+        color_args = ""
+        if pix_fmt == "yuva420p":
+            color_args = "out_color_matrix=bt709:out_range=tv"
+        filters: "List[FilterContext]" = []
+        if self.size is None:
+            width_new = frame.width + frame.width % 2
+            height_new = frame.height + frame.height % 2
+            filters.append(
+                graph.add("pad", f"{width_new}:{height_new}:0:0:color=#00000000")
+            )
+            if color_args:
+                filters.append(graph.add("scale", color_args))
+        else:
+            scale_args = f"{self.size[0]}:{self.size[1]}:flags=area"
+            if color_args:
+                scale_args += f":{color_args}"
+            filters.append(graph.add("scale", scale_args))
+        filters.append(graph.add("format", pix_fmt))
+        filters.append(graph.add("buffersink"))
+        in_src.link_to(filters[0])
+        for filter_from, filter_to in zip(filters, filters[1:]):
+            filter_from.link_to(filter_to)
+        graph.configure()
+
+        self.graph = graph
+
+    def process(self, frame: "VideoFrame", pix_fmt: str) -> "VideoFrame":
+        from av.video.frame import VideoFrame
+
+        input_key = (frame.width, frame.height, frame.format.name, pix_fmt)
+        if self.graph is None or input_key != self.input_key:
+            self._configure(frame, pix_fmt)
+            self.input_key = input_key
+        assert self.graph is not None
+
+        self.graph.push(frame)
+        return cast(VideoFrame, self.graph.pull())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Frames resized by a thread at a time
+RESIZE_CHUNK_FRAMES = 8
+
+# Resized width, height and offset on canvas
+Geometry = Tuple[int, int, int, int]
+
+
+class FrameResizer:
+    """
+    Resize RGBA frames to fit within res, with padding, centered on canvas
+    filled with bg_color.
+
+    Geometry is computed once per shape of input frames. Frames are written
+    into one array allocated and filled with bg_color at once, so that only
+    the area covered by each resized frame is composited.
+
+    Pillow releases GIL while resizing, so chunks of frames are resized in
+    threads.
+    """
+
+    def __init__(
+        self,
+        res: Tuple[int, int],
+        bg_color: Tuple[int, int, int, int],
+        resample: Literal[0, 1, 2, 3, 4, 5],
+        padding_percent: int = 0,
+        size_orig: Optional[Tuple[int, int]] = None,
+        threads: int = 1,
+    ) -> None:
+        self.res = res
+        self.bg_color = bg_color
+        self.resample: Literal[0, 1, 2, 3, 4, 5] = resample
+        self.scaling = 1 - (padding_percent / 100)
+        # Size to keep aspect ratio of, if frames were prescaled from it
+        self.size_orig = size_orig
+        self.threads = threads
+        self.geometries: Dict[Tuple[int, ...], Geometry] = {}
+        # Background under resized frame, by its size
+        self.bg_images: Dict[Tuple[int, int], Image.Image] = {}
+
+    def geometry(self, shape: Tuple[int, ...]) -> Geometry:
+        geometry = self.geometries.get(shape)
+        if geometry is not None:
+            return geometry
+
+        res_w, res_h = self.res
+        if self.size_orig is not None:
+            width, height = self.size_orig
+        else:
+            height, width = shape[:2]
+        if width / res_w > height / res_h:
+            width_new = int(res_w * self.scaling)
+            height_new = int(height * res_w / width * self.scaling)
+        else:
+            height_new = int(res_h * self.scaling)
+            width_new = int(width * res_h / height * self.scaling)
+
+        geometry = (
+            width_new,
+            height_new,
+            (res_w - width_new) // 2,
+            (res_h - height_new) // 2,
+        )
+        self.geometries[shape] = geometry
+        return geometry
+
+    def _resize_into(
+        self, frame: "np.ndarray[Any, Any]", canvas: "np.ndarray[Any, Any]"
+    ) -> None:
+        width_new, height_new, x, y = self.geometry(frame.shape)
+        region = canvas[y : y + height_new, x : x + width_new]
+        with Image.fromarray(frame, "RGBA") as im:  # type: ignore
+            with im.resize(
+                (width_new, height_new), resample=self.resample
+            ) as im_resized:
+                if self.bg_color[3] == 0:
+                    # Same as compositing onto transparent background,
+                    # which only shows background where frame is transparent
+                    region[...] = np.asarray(im_resized)
+                    region[region[:, :, 3] == 0] = self.bg_color
+                else:
+                    bg_image = self.bg_images[(width_new, height_new)]
+                    with Image.alpha_composite(bg_image, im_resized) as im_new:
+                        region[...] = np.asarray(im_new)
+
+    def _resize_chunk(
+        self,
+        frames: "Sequence[np.ndarray[Any, Any]]",
+        canvases: "np.ndarray[Any, Any]",
+    ) -> None:
+        for frame, canvas in zip(frames, canvases):
+            self._resize_into(frame, canvas)
+
+    def resize(
+        self, frames: "Sequence[np.ndarray[Any, Any]]"
+    ) -> "np.ndarray[Any, Any]":
+        # Returns resized frames as (N, res_h, res_w, 4) array
+        res_w, res_h = self.res
+        frames_out: "np.ndarray[Any, Any]" = np.empty(
+            (len(frames), res_h, res_w, 4), dtype=np.uint8
+        )
+        frames_out[...] = self.bg_color
+        if not frames:
+            return frames_out
+
+        # Prepared before threads start, as they only read them
+        for frame in frames:
+            width_new, height_new, _, _ = self.geometry(frame.shape)
+            if self.bg_color[3] != 0 and (width_new, height_new) not in self.bg_images:
+                self.bg_images[(width_new, height_new)] = Image.new(
+                    "RGBA", (width_new, height_new), self.bg_color
+                )
+
+        chunks: List[Tuple[int, int]] = [
+            (start, start + RESIZE_CHUNK_FRAMES)
+            for start in range(0, len(frames), RESIZE_CHUNK_FRAMES)
+        ]
+        threads = min(self.threads, len(chunks))
+        if threads <= 1:
+            self._resize_chunk(frames, frames_out)
+            return frames_out
+
+        def resize_chunk(chunk: Tuple[int, int]) -> None:
+            start, end = chunk
+            self._resize_chunk(frames[start:end], frames_out[start:end])
+
+        # Small chunks are taken by whichever thread is free
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for _ in executor.map(resize_chunk, chunks):
+                pass
+        return frames_out
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+from typing import Any, Iterator, List, Sequence, Tuple, Union, overload
+
+import numpy as np
+
+# Frames compared at once in has_dup() and dedup(), to bound temporary arrays
+DUP_CHUNK_FRAMES = 16
+
+# Frames are compared for merging by average of blocks of this many pixels
+# square, so that noise and dithering within a block are not counted
+MERGE_BLOCK = 8
+
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def frames_color_mean(frames: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+    """
+    Average of r, g and b weighted by alpha, over pixels with alpha > 0,
+    of RGBA frames shaped (..., H, W, 4). 0 for fully transparent frames.
+    """
+    alpha = frames[..., 3]
+    rgb_sum = frames[..., :3].sum(axis=-1, dtype=np.uint32)
+    weighted: "np.ndarray[Any, np.dtype[np.uint64]]" = (rgb_sum * alpha).sum(
+        axis=(-2, -1), dtype=np.uint64
+    )
+    count = np.count_nonzero(alpha, axis=(-2, -1))
+    return np.divide(
+        weighted / (3 * 255),
+        count,
+        out=np.zeros_like(weighted, dtype=np.float64),
+        where=count != 0,
+    )
+
+
+class FrameStack:
+    """
+    Frames of the same shape held in one (N, H, W, 4) uint8 array.
+
+    Taking a subset of frames returns a view where possible,
+    so that dropping frames does not copy them.
+    """
+
+    def __init__(self, frames: "np.ndarray[Any, np.dtype[np.uint8]]") -> None:
+        self.frames = frames
+
+    @staticmethod
+    def from_list(frames: "Sequence[np.ndarray[Any, Any]]") -> "FrameStack":
+        return FrameStack(np.stack(frames))
+
+    @property
+    def shape(self) -> Tuple[int, int, int, int]:
+        n, h, w, c = self.frames.shape
+        return (n, h, w, c)
+
+    def take(self, index: List[int]) -> "FrameStack":
+        if len(index) == 0:
+            return FrameStack(self.frames[0:0])
+        step = index[1] - index[0] if len(index) > 1 else 1
+        if step > 0 and index == list(range(index[0], index[-1] + 1, step)):
+            return FrameStack(self.frames[index[0] : index[-1] + 1 : step])
+        return FrameStack(self.frames[index])
+
+    def concat(self) -> "np.ndarray[Any, Any]":
+        # Frames stacked vertically, for quantizing all frames with one palette
+        n, h, w, c = self.shape
+        return np.ascontiguousarray(self.frames).reshape(n * h, w, c)
+
+    def _equal_next(self) -> "Iterator[np.ndarray[Any, Any]]":
+        # Whether each frame is identical to the one following it, by chunk
+        for i in range(0, len(self.frames) - 1, DUP_CHUNK_FRAMES):
+            current = self.frames[i : i + DUP_CHUNK_FRAMES]
+            following = self.frames[i + 1 : i + DUP_CHUNK_FRAMES + 1]
+            current = current[: len(following)]
+            yield (current == following).reshape(len(current), -1).all(axis=1)
+
+    def has_dup(self) -> bool:
+        # Whether any two consecutive frames are identical
+        return any(equal.any() for equal in self._equal_next())
+
+    def _block_features(self) -> "np.ndarray[Any, Any]":
+        # Average of luma premultiplied by alpha, and of alpha, in each block
+        n, h, w, _ = self.shape
+        rows = np.arange(0, h, MERGE_BLOCK, dtype=np.intp)
+        cols = np.arange(0, w, MERGE_BLOCK, dtype=np.intp)
+        counts = np.add.reduceat(
+            np.add.reduceat(np.ones((h, w), dtype=np.float32), rows, axis=0),
+            cols,
+            axis=1,
+        )
+        features = np.empty((n, len(rows), len(cols), 2), dtype=np.float32)
+        for i in range(0, n, DUP_CHUNK_FRAMES):
+            chunk = self.frames[i : i + DUP_CHUNK_FRAMES]
+            alpha = chunk[..., 3].astype(np.float32)
+            luma = (chunk[..., :3] @ LUMA_WEIGHTS) * alpha / 255
+            planes = np.stack((luma, alpha), axis=-1)
+            sums = np.add.reduceat(np.add.reduceat(planes, rows, axis=1), cols, axis=2)
+            features[i : i + len(chunk)] = sums / counts[:, :, None]
+        return features
+
+    def _merge_starts(self, threshold: float) -> List[int]:
+        # Index of frames kept, each differing from previous kept frame
+        # by at least threshold percent in some block
+        features = self._block_features()
+        limit = threshold * 255 / 100
+        starts = [0]
+        i = 1
+        while i < len(features):
+            diff = np.abs(features[i : i + DUP_CHUNK_FRAMES] - features[starts[-1]])
+            over = np.flatnonzero(diff.max(axis=(1, 2, 3)) >= limit)
+            if len(over) == 0:
+                i += DUP_CHUNK_FRAMES
+                continue
+            i += int(over[0])
+            starts.append(i)
+            i += 1
+        return starts
+
+    def dedup(self, threshold: float = 0) -> "Tuple[FrameStack, List[int]]":
+        """
+        Frames with each run of identical consecutive frames merged into one,
+        and number of frames each of them is held for.
+
+        If threshold is set, frames are also merged into previous kept frame
+        if they differ from it by less than threshold percent in every block
+        of MERGE_BLOCK pixels, in brightness and in alpha.
+        """
+        if len(self.frames) <= 1:
+            return self, [1] * len(self.frames)
+        if threshold > 0:
+            starts = self._merge_starts(threshold)
+        else:
+            equal = np.concatenate(list(self._equal_next()))
+            starts = [0, *(np.flatnonzero(~equal) + 1).tolist()]
+        hold: List[int] = np.diff([*starts, len(self.frames)]).tolist()
+        if len(starts) == len(self.frames):
+            return self, hold
+        return self.take(starts), hold
+
+    def color_mean(self) -> "np.ndarray[Any, Any]":
+        return frames_color_mean(self.frames)
+
+    def alpha_binarized(self) -> "np.ndarray[Any, Any]":
+        """
+        Alpha channel with lowest alpha changed to 0, and all others to 255.
+        Unchanged if all frames are opaque.
+        """
+        alpha = self.frames[..., 3]
+        alpha_min = alpha.min()
+        if alpha_min == 255:
+            return alpha
+        return np.where(alpha > alpha_min, np.uint8(255), np.uint8(0))
+
+    @overload
+    def __getitem__(self, index: int) -> "np.ndarray[Any, Any]": ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "FrameStack": ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> "Union[np.ndarray[Any, Any], FrameStack]":
+        if isinstance(index, slice):
+            return FrameStack(self.frames[index])
+        return self.frames[index]
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __iter__(self) -> "Iterator[np.ndarray[Any, Any]]":
+        return iter(self.frames)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+from tempfile import TemporaryFile
+from threading import Lock
+from typing import IO, Any, Iterator, List, Optional, Tuple, Union, overload
+
+import numpy as np
+
+# (offset, shape, dtype) of frame in spill file
+SpilledFrame = Tuple[int, Tuple[int, ...], "np.dtype[Any]"]
+
+
+class FrameStore:
+    """
+    List of frames that keeps frames in memory until they take up mem_limit
+    bytes, then writes further frames to a temporary file in spill_dir and
+    reads them back through memory mapping.
+
+    mem_limit of 0 keeps every frame in memory.
+    Spilled frames are read-only.
+
+    Frames skipped by importer are kept as None placeholders, so that
+    index of frames still matches input, and can be filled in later.
+
+    A frame identical to another one, like a frame held for several ticks,
+    can be stored as reference to index of that frame, sharing its data.
+
+    If track_bbox, union of bounding box of pixels with alpha > 0 of frames
+    put is kept as bbox, in (left, top, right, bottom). None if no such pixel.
+    """
+
+    def __init__(
+        self,
+        mem_limit: int = 0,
+        spill_dir: Optional[str] = None,
+        track_bbox: bool = False,
+    ) -> None:
+        self.mem_limit = mem_limit
+        self.spill_dir = spill_dir
+        self.track_bbox = track_bbox
+        self.bbox: Optional[Tuple[int, int, int, int]] = None
+        self.mem_size = 0
+        # int is index of frame referred to
+        self.frames: "List[Union[None, np.ndarray[Any, Any], SpilledFrame, int]]" = []
+        self.spill_f: Optional[IO[bytes]] = None
+        self.spill_size = 0
+        self.spill_map: "Optional[np.memmap[Any, np.dtype[np.uint8]]]" = None
+        self.lock = Lock()
+
+    def append(self, frame: "Optional[np.ndarray[Any, Any]]") -> None:
+        self.frames.append(None)
+        if frame is not None:
+            self.put(len(self.frames) - 1, frame)
+
+    def put(self, index: int, frame: "np.ndarray[Any, Any]") -> None:
+        if self.track_bbox:
+            self._update_bbox(frame)
+
+        if not self.mem_limit or self.mem_size + frame.nbytes <= self.mem_limit:
+            self.frames[index] = frame
+            self.mem_size += frame.nbytes
+            return
+
+        if self.spill_f is None:
+            # Not in memory_tempfile, which may be backed by RAM
+            self.spill_f = TemporaryFile(dir=self.spill_dir)
+        self.spill_f.seek(self.spill_size)
+        self.spill_f.write(np.ascontiguousarray(frame).tobytes())
+        self.frames[index] = (self.spill_size, frame.shape, frame.dtype)
+        self.spill_size += frame.nbytes
+
+    def _update_bbox(self, frame: "np.ndarray[Any, Any]") -> None:
+        height, width = frame.shape[:2]
+        if self.bbox == (0, 0, width, height):
+            return
+        alpha = frame[:, :, 3]
+        cols = np.flatnonzero(alpha.any(axis=0))
+        if len(cols) == 0:
+            return
+        rows = np.flatnonzero(alpha.any(axis=1))
+        left, top = int(cols[0]), int(rows[0])
+        right, bottom = int(cols[-1]) + 1, int(rows[-1]) + 1
+        if self.bbox is not None:
+            left = min(left, self.bbox[0])
+            top = min(top, self.bbox[1])
+            right = max(right, self.bbox[2])
+            bottom = max(bottom, self.bbox[3])
+        self.bbox = (left, top, right, bottom)
+
+    def put_ref(self, index: int, source: int) -> None:
+        self.frames[index] = self.source(source)
+
+    def source(self, index: int) -> int:
+        # Index of frame holding data of frame at index
+        frame = self.frames[index]
+        if isinstance(frame, int):
+            return frame
+        return index
+
+    def missing(self, index: List[int]) -> List[int]:
+        # Index of frames skipped by importer, or not yet imported at all
+        return sorted(i for i in set(index) if i >= len(self) or self.frames[i] is None)
+
+    def imported(self) -> List[int]:
+        return [i for i, frame in enumerate(self.frames) if frame is not None]
+
+    def _get_frame(self, index: int) -> "np.ndarray[Any, Any]":
+        frame = self.frames[self.source(index)]
+        if frame is None:
+            raise IndexError(f"Frame {index} was not imported")
+        if isinstance(frame, np.ndarray):
+            return frame
+        assert not isinstance(frame, int)
+
+        offset, shape, dtype = frame
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        with self.lock:
+            if self.spill_map is None or self.spill_map.size < offset + nbytes:
+                # Map again to cover frames written since last mapping
+                # Frames returned earlier keep old mapping alive
+                assert self.spill_f is not None
+                self.spill_f.flush()
+                self.spill_map = np.memmap(self.spill_f, dtype=np.uint8, mode="r")
+            spill_map = self.spill_map
+        return spill_map[offset : offset + nbytes].view(dtype).reshape(shape)
+
+    @overload
+    def __getitem__(self, index: int) -> "np.ndarray[Any, Any]": ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "List[np.ndarray[Any, Any]]": ...
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> "Union[np.ndarray[Any, Any], List[np.ndarray[Any, Any]]]":
+        if isinstance(index, slice):
+            return [self._get_frame(i) for i in range(*index.indices(len(self)))]
+        return self._get_frame(index)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __iter__(self) -> "Iterator[np.ndarray[Any, Any]]":
+        for i in range(len(self.frames)):
+            yield self._get_frame(i)
+
+    def close(self) -> None:
+        self.spill_map = None
+        if self.spill_f is not None:
+            self.spill_f.close()
+            self.spill_f = None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, local
+from typing import TYPE_CHECKING, Any, Callable, Generator, List, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from rlottie_python.rlottie_wrapper import LottieAnimation
+
+
+class LottieRenderer:
+    """
+    Render frames of lottie animation to RGBA arrays of size (width, height),
+    using one LottieAnimation created by load for each thread, as frames of
+    one LottieAnimation cannot be rendered concurrently.
+
+    rlottie releases GIL while rendering, so threads render in parallel.
+    """
+
+    def __init__(
+        self,
+        load: "Callable[[], LottieAnimation]",
+        size: Tuple[int, int],
+        threads: int = 1,
+    ) -> None:
+        self.load = load
+        self.size = size
+        self.threads = threads
+        self.local = local()
+        self.anims: "List[LottieAnimation]" = []
+        self.lock = Lock()
+
+    def _get_anim(self) -> "LottieAnimation":
+        anim = getattr(self.local, "anim", None)
+        if anim is None:
+            anim = self.load()
+            self.local.anim = anim
+            with self.lock:
+                self.anims.append(anim)
+        return anim
+
+    def render(self, frame_num: int) -> "np.ndarray[Any, Any]":
+        width, height = self.size
+        buffer = self._get_anim().lottie_animation_render(
+            frame_num=frame_num, width=width, height=height
+        )
+        # rlottie renders BGRA, reorder to RGBA while copying out of buffer
+        bgra = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 4)
+        return bgra[:, :, [2, 1, 0, 3]]
+
+    def render_frames(
+        self, frames: List[int]
+    ) -> "Generator[np.ndarray[Any, Any], None, None]":
+        # Frames are yielded in order of frames
+        threads = min(self.threads, len(frames))
+        if threads <= 1:
+            for i in frames:
+                yield self.render(i)
+            return
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            yield from executor.map(self.render, frames)
+
+    def close(self) -> None:
+        with self.lock:
+            for anim in self.anims:
+                anim.lottie_animation_destroy()
+            self.anims.clear()
+        self.local = local()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from sticker_convert.utils.media.size_predictor import SizePredictor
+
+# Index of level chosen for (res, quality, fps, color)
+ParamPoint = Tuple[int, int, int, int]
+
+
+class ParamSearch:
+    """
+    Search resolution, quality, fps and color independently, instead of
+    along the single step ladder of generate_steps_list().
+
+    Levels of each parameter are ordered from best to worst, and the loss of
+    a point is mainly the largest ladder step of its levels. The point with lowest
+    loss that is predicted to be within size_max is compressed next. Points
+    that cannot beat the best result, or that only have levels better than
+    an oversized result, are never compressed.
+    """
+
+    def __init__(
+        self,
+        predictor: SizePredictor,
+        level_steps: List[List[int]],
+        pixels: List[int],
+        qualities: List[Optional[int]],
+        frames: List[int],
+        colors: List[Optional[int]],
+        size_max: int,
+    ) -> None:
+        self.predictor = predictor
+        self.inputs = (pixels, qualities, frames, colors)
+        self.size_max = size_max
+
+        self.shape = tuple(len(i) for i in level_steps)
+        # Worst step among parameters decides, like the step ladder
+        # Total of steps breaks ties, so other parameters are kept high
+        grid = np.meshgrid(*level_steps, indexing="ij")
+        steps_max = np.max(grid, axis=0)
+        steps_sum = np.sum(grid, axis=0)
+        self.loss: "np.ndarray[Any, np.dtype[np.int64]]" = (
+            steps_max * (int(steps_sum.max()) + 1) + steps_sum
+        )
+        self.excluded: "np.ndarray[Any, np.dtype[np.bool_]]" = np.zeros(
+            self.shape, dtype=np.bool_
+        )
+
+        self.loss_best: Optional[int] = None
+        self.point_best: Optional[ParamPoint] = None
+
+    def next_point(self) -> Optional[ParamPoint]:
+        candidates = ~self.excluded
+        if self.loss_best is not None:
+            candidates &= self.loss < self.loss_best
+        if not candidates.any():
+            return None
+
+        size_pred = self.predictor.predict_grid(*self.inputs)
+        fits = candidates & (size_pred <= self.size_max)
+        if fits.any():
+            # Lowest loss first, then largest size as it is closer to the limit
+            order = np.lexsort((-size_pred[fits], self.loss[fits]))
+            flat = np.flatnonzero(fits)[order[0]]
+        elif self.point_best is None:
+            # Nothing predicted to fit, try the smallest point to find any result
+            flat = np.flatnonzero(candidates)[np.argmin(size_pred[candidates])]
+        else:
+            return None
+
+        return tuple(int(i) for i in np.unravel_index(flat, self.shape))  # type: ignore
+
+    def update(self, point: ParamPoint, fits: bool) -> None:
+        self.excluded[point] = True
+        if fits:
+            loss = int(self.loss[point])
+            if self.loss_best is None or loss < self.loss_best:
+                self.loss_best = loss
+                self.point_best = point
+        else:
+            # Better or equal level in every parameter would be even larger
+            self.excluded[tuple(slice(0, i + 1) for i in point)] = True
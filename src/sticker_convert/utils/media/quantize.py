@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union, cast
+
+import numpy as np
+from PIL import Image
+
+# Upper limit of bytes held by quantization work of one sticker
+QUANTIZE_CACHE_SIZE_MAX = 128 * 1024 * 1024
+
+# Frame does not fit palette shared by frames if its error is this many times
+# that of median frame
+PALETTE_FIT_RATIO = 2.0
+
+
+def _imagequant() -> Tuple[Any, Any]:
+    # cffi handles of imagequant are untyped, so they are typed as Any here
+    # instead of every call on them being unknown
+    from imagequant import ffi, lib  # type: ignore
+
+    return cast(Any, ffi), cast(Any, lib)
+
+
+class LiqPalettes:
+    """
+    Images prepared for libimagequant, with palettes quantized from them
+    for each number of colors.
+
+    Palettes are reused by search steps that only change quality, and
+    remapped with the dithering of the step. Calls libimagequant directly,
+    as imagequant.quantize_pil_image() converts pixels to bytes in a slow
+    python loop.
+    """
+
+    def __init__(self, images: List[Image.Image]) -> None:
+        ffi, lib = _imagequant()
+
+        self.attr = ffi.gc(lib.liq_attr_create(), lib.liq_attr_destroy)
+        # liq_image refers to pixels of data without copying, so data is kept
+        self.images: List[Tuple[Any, bytes, Tuple[int, int]]] = []
+        for image in images:
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+            data = image.tobytes()  # type: ignore
+            width, height = image.size
+            liq_image = ffi.gc(
+                lib.liq_image_create_rgba(self.attr, data, width, height, 0),
+                lib.liq_image_destroy,
+            )
+            self.images.append((liq_image, data, image.size))
+        self.nbytes = sum(len(data) for _, data, _ in self.images)
+        # Palette of each max_colors, with max_quality it was quantized with
+        # and quality achieved
+        self.results: Dict[int, Tuple[Any, int, int]] = {}
+        # libimagequant keeps remapping in result, so it is used by one thread
+        self.lock = Lock()
+
+    def _result(self, max_colors: int, max_quality: int) -> Tuple[Any, int]:
+        ffi, lib = _imagequant()
+
+        cached = self.results.get(max_colors)
+        if cached is not None:
+            result, max_quality_cached, quality = cached
+            # Fewer colors are only used if max_quality can be exceeded,
+            # so palette is the same if quality achieved is below both
+            if quality < min(max_quality, max_quality_cached):
+                return result, quality
+
+        # Histogram is consumed by liq_histogram_quantize()
+        lib.liq_set_max_colors(self.attr, max_colors)
+        lib.liq_set_quality(self.attr, 0, max_quality)
+        histogram = ffi.gc(
+            lib.liq_histogram_create(self.attr), lib.liq_histogram_destroy
+        )
+        for liq_image, _, _ in self.images:
+            code = lib.liq_histogram_add_image(histogram, self.attr, liq_image)
+            if code != lib.LIQ_OK:
+                raise RuntimeError(f"libimagequant error code {code}")
+
+        result_p = ffi.new("liq_result**")
+        code = lib.liq_histogram_quantize(histogram, self.attr, result_p)
+        if code != lib.LIQ_OK:
+            raise RuntimeError(f"libimagequant error code {code}")
+        result = ffi.gc(result_p[0], lib.liq_result_destroy)
+        quality = int(lib.liq_get_quantization_quality(result))
+        self.results[max_colors] = (result, max_quality, quality)
+        return result, quality
+
+    def remap(
+        self,
+        max_colors: int,
+        max_quality: int,
+        dithering_level: float,
+        measure_error: bool = False,
+    ) -> Tuple[List[Image.Image], List[float], int]:
+        """
+        Images remapped to one palette, error of each if measure_error
+        (libimagequant reports the same quality for every image remapped
+        with one palette) and quality (0-100) achieved by the palette.
+        """
+        ffi, lib = _imagequant()
+
+        with self.lock:
+            result, quality = self._result(max_colors, max_quality)
+            lib.liq_set_dithering_level(result, dithering_level)
+            palette_bytes = _palette_bytes(result)
+            palette = _premultiply(
+                np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, 4)
+            )
+
+            images_quant: List[Image.Image] = []
+            errors: List[float] = []
+            for liq_image, data, (width, height) in self.images:
+                pixels = ffi.new("char[]", width * height)
+                lib.liq_write_remapped_image(result, liq_image, pixels, width * height)
+                if measure_error:
+                    index = np.frombuffer(ffi.buffer(pixels), dtype=np.uint8)
+                    original = _premultiply(
+                        np.frombuffer(data, dtype=np.uint8).reshape(-1, 4)
+                    )
+                    errors.append(float(np.square(palette[index] - original).mean()))
+
+                image_quant = Image.frombytes("P", (width, height), ffi.buffer(pixels))  # type: ignore
+                image_quant.putpalette(palette_bytes, rawmode="RGBA")
+                images_quant.append(image_quant)
+
+        return images_quant, errors, quality
+
+
+def quantize_imagequant(
+    palettes: LiqPalettes,
+    max_colors: int,
+    max_quality: int,
+    dithering_level: float,
+) -> Tuple[Image.Image, int]:
+    """
+    Quantize image of palettes with libimagequant once and return achieved
+    quality (0-100), instead of raising if it is below a minimum.
+    """
+    images_quant, _, quality = palettes.remap(max_colors, max_quality, dithering_level)
+    return images_quant[0], quality
+
+
+def quantize_imagequant_frames(
+    palettes: LiqPalettes,
+    max_colors: int,
+    max_quality: int,
+    dithering_level: float,
+    min_quality: int,
+) -> List[Optional[Image.Image]]:
+    """
+    Quantize frames of palettes with libimagequant to one palette, built from
+    histogram of all frames. None for frames that need a palette of their own,
+    as they do not fit the shared palette, or for all frames if its quality is
+    below min_quality.
+    """
+    images_quant, errors, quality = palettes.remap(
+        max_colors, max_quality, dithering_level, measure_error=True
+    )
+    if quality < min_quality:
+        return [None] * len(images_quant)
+
+    error_max = float(np.median(errors)) * PALETTE_FIT_RATIO
+    return [
+        image_quant if error <= error_max else None
+        for image_quant, error in zip(images_quant, errors)
+    ]
+
+
+def _premultiply(rgba: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+    # Color of transparent pixels does not matter
+    alpha = rgba[:, 3:].astype(np.float32) / 255
+    return np.concatenate((rgba[:, :3] * alpha, rgba[:, 3:]), axis=1)
+
+
+def _palette_bytes(result: Any) -> bytes:
+    _, lib = _imagequant()
+
+    palette = lib.liq_get_palette(result)
+    return bytes(
+        c
+        for i in range(palette.count)
+        for c in (
+            palette.entries[i].r,
+            palette.entries[i].g,
+            palette.entries[i].b,
+            palette.entries[i].a,
+        )
+    )
+
+
+QuantizeEntry = Union[LiqPalettes, Image.Image]
+
+
+class QuantizeCache:
+    """
+    Least recently used cache of quantization work, keyed by what is
+    quantized rather than by its pixels, which are not hashed.
+
+    Holds LiqPalettes of images, whose palettes are reused when only
+    quality changes, and images quantized by Pillow, which ignores quality.
+    """
+
+    def __init__(self, size_max: int = QUANTIZE_CACHE_SIZE_MAX) -> None:
+        self.size_max = size_max
+        self.size = 0
+        self.entries: "OrderedDict[Hashable, QuantizeEntry]" = OrderedDict()
+        self.lock = Lock()
+
+    def get_palettes(self, key: Hashable, images: List[Image.Image]) -> LiqPalettes:
+        with self.lock:
+            entry = self.entries.get(key)
+            if isinstance(entry, LiqPalettes):
+                self.entries.move_to_end(key)
+                return entry
+
+        palettes = LiqPalettes(images)
+        with self.lock:
+            # Another thread may have prepared the same images meanwhile
+            entry = self.entries.get(key)
+            if isinstance(entry, LiqPalettes):
+                return entry
+            self._put(key, palettes, palettes.nbytes)
+        return palettes
+
+    def get_image(self, key: Hashable) -> Optional[Image.Image]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if not isinstance(entry, Image.Image):
+                return None
+            self.entries.move_to_end(key)
+            return entry.copy()
+
+    def put_image(self, key: Hashable, image: Image.Image) -> None:
+        with self.lock:
+            if key in self.entries:
+                return
+            self._put(key, image.copy(), image.width * image.height)
+
+    def _put(self, key: Hashable, entry: QuantizeEntry, nbytes: int) -> None:
+        self.entries[key] = entry
+        self.size += nbytes
+        while self.size > self.size_max and len(self.entries) > 1:
+            _, entry_old = self.entries.popitem(last=False)
+            self.size -= self._nbytes(entry_old)
+
+    @staticmethod
+    def _nbytes(entry: QuantizeEntry) -> int:
+        if isinstance(entry, LiqPalettes):
+            return entry.nbytes
+        return entry.width * entry.height
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from sticker_convert.utils.media.frame_stack import FrameStack
+
+# Upper limit of bytes held by resized frames of one sticker
+# Frames of the resolution in use are kept even if they alone exceed this
+RESIZE_CACHE_SIZE_MAX = 512 * 1024 * 1024
+
+ResizeKey = Tuple[Any, ...]
+
+
+class ResizeEntry:
+    def __init__(self, frames_count: int) -> None:
+        # Resized frames in order of resizing, grown as more frames are resized
+        # Input may have far more frames than those ever resized
+        self.frames: "Optional[np.ndarray[Any, np.dtype[np.uint8]]]" = None
+        self.count = 0
+        # Index in frames of each input frame, -1 if not resized
+        self.slots: "np.ndarray[Any, np.dtype[np.int64]]" = np.full(
+            frames_count, -1, dtype=np.int64
+        )
+
+    @property
+    def nbytes(self) -> int:
+        if self.frames is None:
+            return 0
+        return self.count * self.frames[0].nbytes
+
+    def put(
+        self,
+        index: List[int],
+        frames_resized: "List[np.ndarray[Any, np.dtype[np.uint8]]]",
+    ) -> None:
+        if not index:
+            return
+        count_new = self.count + len(index)
+        frames = self.frames
+        if frames is None or count_new > len(frames):
+            # Frames taken earlier keep referring to old array
+            frames_grown = np.empty(
+                (max(count_new, 2 * self.count), *frames_resized[0].shape),
+                dtype=np.uint8,
+            )
+            if frames is not None:
+                frames_grown[: self.count] = frames[: self.count]
+            frames = frames_grown
+            self.frames = frames
+        for i, frame in zip(index, frames_resized):
+            frames[self.count] = frame
+            self.slots[i] = self.count
+            self.count += 1
+
+    def take(self, index: List[int]) -> FrameStack:
+        assert self.frames is not None
+        return FrameStack(self.frames).take(self.slots[index].tolist())
+
+
+class ResizeCache:
+    """
+    Least recently used cache of resized frames.
+
+    Frames are stored per resize parameters (resolution, scale filter,
+    padding) in one array, together with where each input frame is in it,
+    so that search steps that only differ in quality, fps or color do not
+    resize again.
+    """
+
+    def __init__(self, size_max: int = RESIZE_CACHE_SIZE_MAX) -> None:
+        self.size_max = size_max
+        self.size = 0
+        self.entries: "OrderedDict[ResizeKey, ResizeEntry]" = OrderedDict()
+        self.lock = Lock()
+
+    def get_frames(
+        self,
+        key: ResizeKey,
+        index: List[int],
+        frames_count: int,
+        resize: "Callable[[List[int]], List[np.ndarray[Any, np.dtype[np.uint8]]]]",
+    ) -> FrameStack:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = ResizeEntry(frames_count)
+                self.entries[key] = entry
+            self.entries.move_to_end(key)
+            missing = sorted(i for i in set(index) if entry.slots[i] < 0)
+
+        if missing:
+            frames_resized = resize(missing)
+            with self.lock:
+                size_before = entry.nbytes
+                # Another thread may have resized some of them meanwhile
+                frames_new = {
+                    i: frame
+                    for i, frame in zip(missing, frames_resized)
+                    if entry.slots[i] < 0
+                }
+                entry.put(list(frames_new), list(frames_new.values()))
+                # Entry may be evicted by another thread while resizing
+                if self.entries.get(key) is entry:
+                    self.size += entry.nbytes - size_before
+                self._evict(key)
+
+        with self.lock:
+            return entry.take(index)
+
+    def _evict(self, key_keep: ResizeKey) -> None:
+        for key in list(self.entries):
+            if self.size <= self.size_max:
+                break
+            if key == key_keep:
+                continue
+            entry = self.entries.pop(key)
+            self.size -= entry.nbytes
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+from math import log, log2
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sticker_convert.utils.media.codec_info import CodecInfo
+
+# Rough bytes per pixel per frame of each codec, relative to vp9
+# Only used for guessing output size before anything is encoded
+CODEC_EFFICIENCY: Dict[str, float] = {
+    "av1": 0.8,
+    "hevc": 0.9,
+    "vp9": 1.0,
+    "libvpx-vp9": 1.0,
+    "h264": 1.1,
+    "vp8": 1.4,
+    "libvpx": 1.4,
+    "webp": 1.5,
+    "mpeg4": 2.0,
+    "jpeg": 2.0,
+    "gif": 5.0,
+    "png": 6.0,
+    "apng": 6.0,
+}
+
+SUFFIX_CODEC: Dict[str, str] = {
+    ".webm": "vp9",
+    ".mkv": "vp9",
+    ".mp4": "vp9",
+    ".webp": "webp",
+    ".gif": "gif",
+    ".png": "png",
+    ".apng": "apng",
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+}
+
+# Vector formats, source file size says nothing about output size
+NO_PRIOR_CODEC = ("tgs", "lottie", "lot", "was", "json", "svg")
+
+# Prior slopes of the model, in order of features after intercept:
+# log(pixels), log(frames), quality / 100, palette bits / 8
+SLOPES_VIDEO = (0.8, 0.7, 0.0, 0.0)
+SLOPES_LOSSY_IMAGE = (0.85, 0.8, 2.5, 0.0)
+SLOPES_PALETTE_IMAGE = (0.9, 0.9, 0.5, 1.2)
+
+# How strongly measurements are pulled towards prior slopes
+# Intercept is nearly free so that a single measurement calibrates the model
+RIDGE_WEIGHTS = (1e-3, 4.0, 4.0, 4.0, 4.0)
+
+# (res_w, res_h, quality, frames, color)
+SizeParam = Tuple[int, int, Optional[int], int, Optional[int]]
+
+
+def palette_bits(color: Optional[int]) -> float:
+    # color > 256 disables quantization, which costs more than 8 bits of palette
+    if color is None or color > 256:
+        return 1.25
+    return log2(max(color, 2)) / 8
+
+
+class SizePredictor:
+    """
+    Predict output file size from compression parameters, using
+    log(size) = b0 + b1*log(pixels) + b2*log(frames) + b3*quality + b4*palette.
+
+    Coefficients start from per-format priors and are refitted with ridge
+    regression towards the priors each time a real size is measured.
+    """
+
+    def __init__(self, codec_info: CodecInfo, src_size: int, out_suffix: str) -> None:
+        out_suffix = out_suffix.lower()
+        if out_suffix in (".webm", ".mkv", ".mp4"):
+            slopes = SLOPES_VIDEO
+        elif out_suffix in (".png", ".apng", ".gif"):
+            slopes = SLOPES_PALETTE_IMAGE
+        else:
+            slopes = SLOPES_LOSSY_IMAGE
+
+        self.prior = np.array((0.0,) + slopes, dtype=np.float64)
+        self.has_prior = False
+
+        src_codec = codec_info.codec.lower()
+        if src_size > 0 and src_codec not in NO_PRIOR_CODEC:
+            src_param: SizeParam = (
+                codec_info.res[0],
+                codec_info.res[1],
+                100,
+                max(codec_info.frames, 1),
+                None,
+            )
+            efficiency_in = CODEC_EFFICIENCY.get(src_codec, 1.0)
+            efficiency_out = CODEC_EFFICIENCY.get(SUFFIX_CODEC.get(out_suffix, ""), 1.0)
+            x = self.features(src_param)
+            self.prior[0] = (
+                log(src_size)
+                - float(np.dot(x[1:], self.prior[1:]))
+                + log(efficiency_out / efficiency_in)
+            )
+            self.has_prior = True
+
+        self.coef = self.prior.copy()
+        self.xs: List["np.ndarray[Any, np.dtype[np.float64]]"] = []
+        self.ys: List[float] = []
+
+    @staticmethod
+    def features(
+        param: SizeParam,
+    ) -> "np.ndarray[Any, np.dtype[np.float64]]":
+        res_w, res_h, quality, frames, color = param
+        return np.array(
+            (
+                1.0,
+                log(max(res_w * res_h, 1)),
+                log(max(frames, 1)),
+                (100 if quality is None else quality) / 100,
+                palette_bits(color),
+            ),
+            dtype=np.float64,
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self.has_prior or len(self.ys) > 0
+
+    def update(self, param: SizeParam, size: int) -> None:
+        if size <= 0:
+            return
+        self.xs.append(self.features(param))
+        self.ys.append(log(size))
+
+        x = np.array(self.xs)
+        y = np.array(self.ys)
+        ridge = np.diag(RIDGE_WEIGHTS)
+        # Without prior, intercept is only known from measurements
+        self.coef = np.linalg.solve(x.T @ x + ridge, x.T @ y + ridge @ self.prior)
+
+    def update_lower_bound(self, param: SizeParam, size: int) -> None:
+        # Size of aborted compression is only known to be at least this
+        if self.predict(param) < size:
+            self.update(param, size)
+
+    def predict(self, param: SizeParam) -> float:
+        return float(np.exp(np.dot(self.features(param), self.coef)))
+
+    def predict_grid(
+        self,
+        pixels: List[int],
+        qualities: List[Optional[int]],
+        frames: List[int],
+        colors: List[Optional[int]],
+    ) -> "np.ndarray[Any, np.dtype[np.float64]]":
+        # Predicted size of every combination, with one axis per argument
+        x_pixels = np.log(np.maximum(pixels, 1)) * self.coef[1]
+        x_frames = np.log(np.maximum(frames, 1)) * self.coef[2]
+        x_qualities = (
+            np.array([100 if i is None else i for i in qualities]) / 100 * self.coef[3]
+        )
+        x_colors = np.array([palette_bits(i) for i in colors]) * self.coef[4]
+        return np.exp(
+            self.coef[0]
+            + x_pixels[:, None, None, None]
+            + x_qualities[None, :, None, None]
+            + x_frames[None, None, :, None]
+            + x_colors[None, None, None, :]
+        )
+
+    def boundary(
+        self,
+        params: List[SizeParam],
+        step_lower: int,
+        step_upper: int,
+        size_max: int,
+    ) -> Optional[int]:
+        # Smallest step (= highest quality) predicted to be within size_max,
+        # None if no step is
+        for step in range(step_lower, step_upper + 1):
+            if self.predict(params[step]) <= size_max:
+                return step
+        return None
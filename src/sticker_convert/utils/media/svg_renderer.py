@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import json
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sticker_convert.utils.chrome_remotedebug import CRD
+
+# Number of frames rendered per round-trip to browser
+SVG_RENDER_BATCH = 16
+
+
+class SvgRenderer:
+    """
+    Render frames of svg with a pool of tabs of one Chromium. Tabs are kept
+    open after rendering, for rendering following files.
+
+    Frames are split among tabs, which load the svg and render their frames
+    concurrently. Commands for a batch of frames are sent at once. At most
+    max_tabs tabs are used, which should be the number of render threads.
+    """
+
+    def __init__(self, crd: CRD, max_tabs: int = 1) -> None:
+        self.crd = crd
+        self.max_tabs = max(1, max_tabs)
+        self.tabs_idle: List[CRD] = [crd]
+        self.lock = Lock()
+
+    def _get_tab(self) -> CRD:
+        with self.lock:
+            if self.tabs_idle:
+                return self.tabs_idle.pop()
+        return self.crd.new_tab()
+
+    def _put_tab(self, tab: CRD) -> None:
+        with self.lock:
+            if len(self.tabs_idle) < self.max_tabs or tab is self.crd:
+                self.tabs_idle.append(tab)
+                return
+        tab.close_tab()
+
+    @staticmethod
+    def _load(
+        tab: CRD, svg: str, size: Tuple[int, int], animated: bool
+    ) -> Dict[str, Any]:
+        # Returns clip of screenshot
+        tab.open_html_str(svg)
+        tab.set_transparent_bg()
+        init_js = 'svg = document.getElementsByTagName("svg")[0];'
+        if animated:
+            init_js += "svg.pauseAnimations();"
+        init_js += "JSON.stringify(svg.getBoundingClientRect());"
+        bound = json.loads(
+            json.loads(tab.exec_js(init_js))["result"]["result"]["value"]
+        )
+        return {
+            "x": bound["x"],
+            "y": bound["y"],
+            "width": size[0],
+            "height": size[1],
+            "scale": 1,
+        }
+
+    def _render_chunk(
+        self, svg: str, size: Tuple[int, int], times: Optional[List[float]]
+    ) -> "List[np.ndarray[Any, Any]]":
+        tab = self._get_tab()
+        frames: "List[np.ndarray[Any, Any]]" = []
+        rendered = False
+        try:
+            clip = self._load(tab, svg, size, times is not None)
+            if times is None:
+                result = tab.send_cmds([CRD.screenshot_cmd(clip)])[0]
+                frames.append(np.asarray(CRD.screenshot_image(result)))
+            else:
+                for start in range(0, len(times), SVG_RENDER_BATCH):
+                    commands: List[Dict[str, Any]] = []
+                    for curr_time in times[start : start + SVG_RENDER_BATCH]:
+                        commands.append(
+                            CRD.exec_js_cmd(f"svg.setCurrentTime({curr_time})")
+                        )
+                        commands.append(CRD.screenshot_cmd(clip))
+                    results = tab.send_cmds(commands)
+                    for result in results[1::2]:
+                        frames.append(np.asarray(CRD.screenshot_image(result)))
+            rendered = True
+        finally:
+            # Tab may be left in unknown state if rendering failed. Main tab
+            # is kept, as svg is loaded again before rendering with it
+            if rendered or tab is self.crd:
+                self._put_tab(tab)
+            else:
+                tab.close_tab()
+        return frames
+
+    def render(
+        self, svg: str, size: Tuple[int, int], times: List[float], threads: int = 1
+    ) -> "List[np.ndarray[Any, Any]]":
+        # Render frames at times (in seconds), in order of times
+        if not times:
+            return []
+        chunks_count = max(
+            1, min(threads, self.max_tabs, ceil(len(times) / SVG_RENDER_BATCH))
+        )
+        chunk_size = ceil(len(times) / chunks_count)
+        chunks = [times[i : i + chunk_size] for i in range(0, len(times), chunk_size)]
+        if len(chunks) <= 1:
+            return self._render_chunk(svg, size, times)
+
+        def render_chunk(chunk: List[float]) -> "List[np.ndarray[Any, Any]]":
+            return self._render_chunk(svg, size, chunk)
+
+        frames: "List[np.ndarray[Any, Any]]" = []
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            for frames_chunk in executor.map(render_chunk, chunks):
+                frames.extend(frames_chunk)
+        return frames
+
+    def render_static(self, svg: str, size: Tuple[int, int]) -> "np.ndarray[Any, Any]":
+        return self._render_chunk(svg, size, None)[0]
+
+    def close(self) -> None:
+        # Close tabs opened for rendering. Main tab is closed with its browser
+        with self.lock:
+            tabs, self.tabs_idle = self.tabs_idle, []
+        for tab in tabs:
+            if tab is not self.crd:
+                tab.close_tab()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+from typing import TYPE_CHECKING, Any, Optional, Tuple, cast
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from av.video.frame import VideoFrame
+    from av.video.plane import VideoPlane
+
+# Same conversion as YUV_RGB_MATRIX of converter.py, in fixed point
+FIXED_SHIFT = 16
+COEF_Y = round(1.164 * (1 << FIXED_SHIFT))
+# (Coefficient of U, coefficient of V) for R, G and B
+COEF_UV = (
+    (0, round(1.793 * (1 << FIXED_SHIFT))),
+    (round(-0.213 * (1 << FIXED_SHIFT)), round(-0.533 * (1 << FIXED_SHIFT))),
+    (round(2.112 * (1 << FIXED_SHIFT)), 0),
+)
+
+# yuva420p -> rgba of libswscale may crash in older PyAV
+# https://github.com/PyAV-Org/PyAV/discussions/1510
+SWSCALE_AV_VERSION_MIN = 14
+
+
+def plane_array(plane: "VideoPlane", height: int) -> "np.ndarray[Any, Any]":
+    # 2D view of plane without padding at end of lines, without copying
+    arr: "np.ndarray[Any, Any]" = np.frombuffer(cast(bytes, plane), np.uint8)
+    line_size = abs(plane.line_size)
+    return arr[: line_size * height].reshape(height, line_size)[:, : plane.width]
+
+
+def is_swscale_safe() -> bool:
+    import av
+
+    return int(av.__version__.split(".")[0]) >= SWSCALE_AV_VERSION_MIN
+
+
+class YuvaConverter:
+    """
+    Convert yuva420p frames with even width and height to RGBA.
+
+    Uses integer arithmetic, and adds chroma to each 2x2 block of luma by
+    broadcasting instead of upsampling. Intermediate buffers are reused
+    while frames have the same size, so only one converter should be used
+    by each thread.
+
+    If use_swscale, conversion is done by libswscale instead.
+    """
+
+    def __init__(self, use_swscale: bool = False) -> None:
+        self.use_swscale = use_swscale
+        self.shape: Optional[Tuple[int, int]] = None
+
+    def _allocate(self, height: int, width: int) -> None:
+        self.shape = (height, width)
+        self.luma: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            (height, width), dtype=np.int32
+        )
+        self.channel: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            (height, width), dtype=np.int32
+        )
+        shape_chroma = (height // 2, width // 2)
+        self.u: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            shape_chroma, dtype=np.int32
+        )
+        self.v: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            shape_chroma, dtype=np.int32
+        )
+        self.chroma: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            shape_chroma, dtype=np.int32
+        )
+        self.chroma_v: "np.ndarray[Any, np.dtype[np.int32]]" = np.empty(
+            shape_chroma, dtype=np.int32
+        )
+
+    def convert(self, frame: "VideoFrame") -> "np.ndarray[Any, Any]":
+        if self.use_swscale:
+            return frame.to_ndarray(format="rgba")
+
+        width = frame.width
+        height = frame.height
+        if self.shape != (height, width):
+            self._allocate(height, width)
+
+        y = plane_array(frame.planes[0], height)
+        u = plane_array(frame.planes[1], height // 2)
+        v = plane_array(frame.planes[2], height // 2)
+        a = plane_array(frame.planes[3], height)
+
+        np.clip(y, 16, 235, out=self.luma)
+        self.luma -= 16
+        self.luma *= COEF_Y
+        np.clip(u, 16, 240, out=self.u)
+        self.u -= 128
+        np.clip(v, 16, 240, out=self.v)
+        self.v -= 128
+
+        rgba: "np.ndarray[Any, np.dtype[np.uint8]]" = np.empty(
+            (height, width, 4), dtype=np.uint8
+        )
+        # (height / 2, 2, width / 2, 2) views, so 2x2 blocks share chroma
+        luma_blocks = self.luma.reshape(height // 2, 2, width // 2, 2)
+        channel_blocks = self.channel.reshape(height // 2, 2, width // 2, 2)
+        for i, (coef_u, coef_v) in enumerate(COEF_UV):
+            np.multiply(self.u, coef_u, out=self.chroma)
+            np.multiply(self.v, coef_v, out=self.chroma_v)
+            self.chroma += self.chroma_v
+            np.add(luma_blocks, self.chroma[:, None, :, None], out=channel_blocks)
+            self.channel >>= FIXED_SHIFT
+            np.clip(self.channel, 0, 255, out=self.channel)
+            rgba[:, :, i] = self.channel
+        rgba[:, :, 3] = a
+
+        return rgba
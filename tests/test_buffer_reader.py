@@ -0,0 +1,81 @@
+import array
+import io
+import mmap
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from _pytest._py.path import LocalPath  # type: ignore
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.files.buffer_reader import BufferReader, buffer_size  # type: ignore # noqa: E402
+
+DATA = bytes(range(100))
+
+
+def test_read() -> None:
+    with BufferReader(DATA) as f:
+        assert f.read(10) == DATA[:10]
+        assert f.read(10) == DATA[10:20]
+        assert f.tell() == 20
+        assert f.read() == DATA[20:]
+        assert f.read(10) == b""
+
+
+def test_readinto() -> None:
+    target = bytearray(30)
+    with BufferReader(memoryview(DATA)[90:]) as f:
+        assert f.readinto(target) == 10
+        assert target[:10] == DATA[90:]
+        assert f.readinto(target) == 0
+
+
+def test_seek() -> None:
+    with BufferReader(bytearray(DATA)) as f:
+        assert f.seek(50) == 50
+        assert f.read(1) == DATA[50:51]
+        assert f.seek(-11, io.SEEK_CUR) == 40
+        assert f.seek(-10, io.SEEK_END) == 90
+        assert f.read() == DATA[90:]
+        # Past the end reads nothing, like files
+        assert f.seek(200) == 200
+        assert f.read() == b""
+        with pytest.raises(ValueError):
+            f.seek(-1)
+
+
+def test_wrapped() -> None:
+    with BufferReader(DATA) as f, io.BufferedReader(f) as wrapped:
+        assert wrapped.read(5) == DATA[:5]
+        wrapped.seek(95)
+        assert wrapped.read() == DATA[95:]
+
+
+def test_len_in_bytes() -> None:
+    items = array.array("i", range(10))
+    view = memoryview(items)
+    assert len(view) == 10
+    assert buffer_size(view) == 10 * items.itemsize
+
+    with BufferReader(view) as f:
+        assert f.seek(0, io.SEEK_END) == 10 * items.itemsize
+        f.seek(0)
+        assert f.read() == items.tobytes()
+
+
+def test_close_releases_mmap(tmp_path: LocalPath) -> None:
+    path = Path(tmp_path) / "data"
+    path.write_bytes(DATA)
+    with open(path, "rb") as f_in:
+        mm = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+    assert buffer_size(mm) == len(DATA)
+
+    f = BufferReader(mm)
+    assert f.read(4) == DATA[:4]
+    f.close()
+    assert f.closed
+    # Would raise BufferError if views of mmap were still held
+    mm.close()
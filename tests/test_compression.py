@@ -1,7 +1,10 @@
 import os
+import shutil
 import sys
 from pathlib import Path
+from typing import List, Optional
 
+import pytest
 from _pytest._py.path import LocalPath  # type: ignore
 
 from tests.common import COMPRESSION_DICT, PYTHON_EXE, SAMPLE_DIR, SRC_DIR, run_cmd
@@ -14,8 +17,23 @@ from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # n
 SIZE_MAX_IMG = COMPRESSION_DICT.get("custom").get("size_max").get("img")
 SIZE_MAX_VID = COMPRESSION_DICT.get("custom").get("size_max").get("vid")
 
-
-def _run_sticker_convert(fmt: str, tmp_path: LocalPath) -> None:
+# Compression options that should not change whether output meets the limits
+OPTION_ARGS = (
+    ["--parallel-steps", "2"],
+    ["--frame-mem-limit", "1"],
+    ["--fps-min", "30"],
+    ["--decode-threads", "2"],
+    ["--search-method", "multidim", "--search-budget", "8"],
+    ["--estimate-margin", "0.3"],
+    ["--no-prescale"],
+    ["--auto-trim"],
+    ["--merge-min", "0", "--merge-max", "5"],
+)
+
+
+def _run_sticker_convert(
+    fmt: str, tmp_path: LocalPath, extra_args: Optional[List[str]] = None
+) -> None:
     run_cmd(
         [
             PYTHON_EXE,
@@ -35,6 +53,7 @@ def _run_sticker_convert(fmt: str, tmp_path: LocalPath) -> None:
             fmt,
             "--vid-format",
             fmt,
+            *(extra_args or []),
         ],
         cwd=SRC_DIR,
     )
@@ -54,6 +73,11 @@ def _run_sticker_convert(fmt: str, tmp_path: LocalPath) -> None:
         assert fpath.is_file()
         assert os.path.getsize(fpath) < size_max
 
+        width, height = CodecInfo.get_file_res(fpath)
+        print(f"[TEST] {fname}: {width=} {height=}")
+        assert width <= preset_dict.get("res").get("w").get("max")
+        assert height <= preset_dict.get("res").get("h").get("max")
+
         if i.name.startswith("animated_"):
             print(f"[TEST] {fname}: {fps=} {frames=} {duration=}")
             duration_min = preset_dict.get("duration").get("min")
@@ -91,3 +115,43 @@ def test_to_animated_webp(tmp_path: LocalPath) -> None:
 
 def test_to_animated_mp4(tmp_path: LocalPath) -> None:
     _run_sticker_convert(".mp4", tmp_path)
+
+
+@pytest.mark.parametrize("extra_args", OPTION_ARGS)
+def test_options(tmp_path: LocalPath, extra_args: List[str]) -> None:
+    _run_sticker_convert(".webp", tmp_path, extra_args)
+
+
+def test_webm_fps_max(tmp_path: LocalPath) -> None:
+    # Frame count not divisible by 3, so frames do not end on a whole
+    # millisecond at 30 fps
+    input_dir = Path(tmp_path) / "input"
+    output_dir = Path(tmp_path) / "output"
+    input_dir.mkdir()
+    shutil.copy(SAMPLE_DIR / "animated_webm_161x121_2s_vp9a.webm", input_dir)
+    run_cmd(
+        [
+            PYTHON_EXE,
+            "sticker-convert.py",
+            "--input-dir",
+            str(input_dir),
+            "--output-dir",
+            str(output_dir),
+            "--preset",
+            "custom",
+            "--fps-min",
+            "30",
+            "--fps-max",
+            "30",
+            "--no-confirm",
+            "--vid-format",
+            ".webm",
+        ],
+        cwd=SRC_DIR,
+    )
+
+    fpath = output_dir / "animated_webm_161x121_2s_vp9a.webm"
+    fps, frames, duration = CodecInfo.get_file_fps_frames_duration(fpath)
+    print(f"[TEST] {fpath.name}: {fps=} {frames=} {duration=}")
+    assert frames % 3 != 0
+    assert fps <= 30
@@ -0,0 +1,97 @@
+import os
+import sys
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.media.frame_stack import DUP_CHUNK_FRAMES, MERGE_BLOCK, FrameStack  # type: ignore # noqa: E402
+
+SIZE = 2 * MERGE_BLOCK
+
+
+def _frame(value: int, alpha: int = 255) -> "np.ndarray[Any, np.dtype[np.uint8]]":
+    frame = np.full((SIZE, SIZE, 4), value, dtype=np.uint8)
+    frame[..., 3] = alpha
+    return frame
+
+
+def _stack(values: List[int]) -> FrameStack:
+    return FrameStack.from_list([_frame(i) for i in values])
+
+
+def _values(stack: FrameStack) -> List[int]:
+    return [int(frame[0, 0, 0]) for frame in stack]
+
+
+def test_take_view() -> None:
+    stack = _stack(list(range(10)))
+    taken = stack.take([2, 4, 6])
+    assert _values(taken) == [2, 4, 6]
+    assert np.shares_memory(taken.frames, stack.frames)
+    assert _values(stack.take([5, 1])) == [5, 1]
+    assert len(stack.take([])) == 0
+
+
+def test_dedup_identical() -> None:
+    stack = _stack([0, 0, 0, 1, 2, 2, 0])
+    assert stack.has_dup()
+
+    deduped, hold = stack.dedup()
+    assert _values(deduped) == [0, 1, 2, 0]
+    assert hold == [3, 1, 2, 1]
+
+
+def test_dedup_no_dup() -> None:
+    stack = _stack([0, 1, 2, 3])
+    assert not stack.has_dup()
+
+    deduped, hold = stack.dedup()
+    assert deduped is stack
+    assert hold == [1, 1, 1, 1]
+
+
+def test_dedup_across_chunks() -> None:
+    values = [0] * (DUP_CHUNK_FRAMES + 3) + [1] * (DUP_CHUNK_FRAMES * 2)
+    deduped, hold = _stack(values).dedup()
+    assert _values(deduped) == [0, 1]
+    assert hold == [DUP_CHUNK_FRAMES + 3, DUP_CHUNK_FRAMES * 2]
+
+
+def test_merge_below_threshold() -> None:
+    # Threshold of 5% is a difference of 12.75 in brightness
+    stack = _stack([100, 110, 90, 140, 130])
+    deduped, hold = stack.dedup(5)
+    assert _values(deduped) == [100, 140]
+    assert hold == [3, 2]
+
+    # Larger threshold merges all
+    deduped, hold = stack.dedup(20)
+    assert _values(deduped) == [100]
+    assert hold == [5]
+
+
+def test_merge_compared_to_kept_frame() -> None:
+    # Small changes that add up are not merged away
+    stack = _stack([0, 8, 16, 24, 32])
+    deduped, hold = stack.dedup(5)
+    assert _values(deduped) == [0, 16, 32]
+    assert hold == [2, 2, 1]
+
+
+def test_merge_by_block() -> None:
+    # Change in one block is not averaged out over whole frame
+    frames = [_frame(100), _frame(100)]
+    frames[1][:MERGE_BLOCK, :MERGE_BLOCK, :3] = 140
+    deduped, _ = FrameStack.from_list(frames).dedup(5)
+    assert len(deduped) == 2
+
+
+def test_merge_alpha() -> None:
+    frames = [_frame(100, 255), _frame(100, 200), _frame(100, 205)]
+    deduped, hold = FrameStack.from_list(frames).dedup(5)
+    assert [int(frame[0, 0, 3]) for frame in deduped] == [255, 200]
+    assert hold == [1, 2]
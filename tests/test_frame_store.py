@@ -0,0 +1,91 @@
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from _pytest._py.path import LocalPath  # type: ignore
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.media.frame_store import FrameStore  # type: ignore # noqa: E402
+
+FRAME_SHAPE = (4, 4, 4)
+FRAME_NBYTES = 4 * 4 * 4
+
+
+def _frame(value: int) -> "np.ndarray[Any, np.dtype[np.uint8]]":
+    return np.full(FRAME_SHAPE, value, dtype=np.uint8)
+
+
+def test_in_memory() -> None:
+    store = FrameStore()
+    for i in range(5):
+        store.append(_frame(i))
+
+    assert store.spill_f is None
+    assert store.mem_size == 5 * FRAME_NBYTES
+    assert [int(frame[0, 0, 0]) for frame in store] == [0, 1, 2, 3, 4]
+
+
+def test_spill(tmp_path: LocalPath) -> None:
+    store = FrameStore(2 * FRAME_NBYTES, str(tmp_path))
+    for i in range(5):
+        store.append(_frame(i))
+
+    assert store.mem_size == 2 * FRAME_NBYTES
+    assert store.spill_size == 3 * FRAME_NBYTES
+    assert isinstance(store.frames[1], np.ndarray)
+    assert not isinstance(store.frames[2], np.ndarray)
+
+    frame = store[3]
+    assert frame.shape == FRAME_SHAPE
+    assert frame.dtype == np.uint8
+    assert int(frame[0, 0, 0]) == 3
+    # Spilled frames are read-only
+    assert not frame.flags.writeable
+
+    # Frames spilled after mapping are mapped again
+    store.append(_frame(5))
+    assert [int(frame[0, 0, 0]) for frame in store[2:]] == [2, 3, 4, 5]
+    # Frame returned earlier is still valid
+    assert int(frame[0, 0, 0]) == 3
+
+    store.close()
+    assert store.spill_f is None
+
+
+def test_ref(tmp_path: LocalPath) -> None:
+    store = FrameStore(FRAME_NBYTES, str(tmp_path))
+    store.append(_frame(0))
+    store.append(_frame(1))
+    store.append(None)
+    store.append(None)
+
+    store.put_ref(2, 1)
+    # Reference to reference refers to frame holding data
+    store.put_ref(3, 2)
+    assert store.source(3) == 1
+    assert int(store[3][0, 0, 0]) == 1
+    # No data added for references
+    assert store.spill_size == FRAME_NBYTES
+    store.close()
+
+
+def test_placeholder() -> None:
+    store = FrameStore()
+    store.append(_frame(0))
+    store.append(None)
+    store.append(_frame(2))
+    store.append(None)
+
+    assert store.imported() == [0, 2]
+    assert store.missing([0, 1, 3, 5]) == [1, 3, 5]
+    with pytest.raises(IndexError):
+        store[1]
+
+    store.put(1, _frame(1))
+    assert store.missing([0, 1, 3]) == [3]
+    assert int(store[1][0, 0, 0]) == 1
@@ -0,0 +1,88 @@
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from tests.common import SAMPLE_DIR
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # noqa: E402
+from sticker_convert.utils.media.param_search import ParamSearch  # type: ignore # noqa: E402
+from sticker_convert.utils.media.size_predictor import SizePredictor  # type: ignore # noqa: E402
+
+SAMPLE_WEBM = SAMPLE_DIR / "animated_webm_161x121_2s_vp9a.webm"
+
+# Three levels of resolution and fps, from best to worst
+LEVEL_STEPS = [[0, 4, 8], [0], [0, 4, 8], [0]]
+PIXELS = [512 * 512, 384 * 384, 256 * 256]
+QUALITIES: List[Optional[int]] = [50]
+FRAMES = [30, 20, 10]
+COLORS: List[Optional[int]] = [None]
+
+
+@pytest.fixture(scope="module")
+def predictor() -> SizePredictor:
+    predictor = SizePredictor(CodecInfo(SAMPLE_WEBM), 0, ".webm")
+    predictor.update((512, 512, 50, 30, None), 1000000)
+    return predictor
+
+
+def _search(predictor: SizePredictor, size_max: float) -> ParamSearch:
+    return ParamSearch(
+        predictor, LEVEL_STEPS, PIXELS, QUALITIES, FRAMES, COLORS, int(size_max)
+    )
+
+
+def _size(predictor: SizePredictor, res: int, fps: int) -> float:
+    return float(
+        predictor.predict_grid(PIXELS, QUALITIES, FRAMES, COLORS)[res, 0, fps, 0]
+    )
+
+
+def test_best_point_first(predictor: SizePredictor) -> None:
+    search = _search(predictor, _size(predictor, 0, 0) + 1)
+    assert search.next_point() == (0, 0, 0, 0)
+
+    search.update((0, 0, 0, 0), True)
+    assert search.point_best == (0, 0, 0, 0)
+    # Nothing can beat it
+    assert search.next_point() is None
+
+
+def test_lowest_loss_predicted_to_fit(predictor: SizePredictor) -> None:
+    # Best points that fit drop one parameter to middle level
+    size_max = max(_size(predictor, 1, 0), _size(predictor, 0, 1)) + 1
+    assert size_max < _size(predictor, 0, 0)
+    search = _search(predictor, size_max)
+
+    point = search.next_point()
+    assert point in ((0, 0, 1, 0), (1, 0, 0, 0))
+    assert point is not None
+
+    search.update(point, True)
+    # Other one has same loss, and cannot beat it
+    assert search.next_point() is None
+
+
+def test_oversized_excludes_better_points(predictor: SizePredictor) -> None:
+    search = _search(predictor, _size(predictor, 1, 0) + 1)
+
+    search.update((1, 0, 1, 0), False)
+    assert search.excluded[0, 0, 0, 0]
+    assert search.excluded[1, 0, 0, 0]
+    assert search.excluded[0, 0, 1, 0]
+    assert not search.excluded[2, 0, 0, 0]
+    assert search.next_point() not in ((1, 0, 0, 0), (0, 0, 1, 0))
+
+
+def test_nothing_predicted_to_fit(predictor: SizePredictor) -> None:
+    search = _search(predictor, 1)
+    # Smallest point is tried to find any result
+    assert search.next_point() == (2, 0, 2, 0)
+
+    search.update((2, 0, 2, 0), True)
+    assert search.next_point() is None
@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from _pytest._py.path import LocalPath  # type: ignore
+
+from tests.common import SAMPLE_DIR
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.converter import StickerConvert  # type: ignore # noqa: E402
+from sticker_convert.job_option import CompOption  # type: ignore # noqa: E402
+from sticker_convert.utils.media.size_predictor import SizeParam, SizePredictor  # type: ignore # noqa: E402
+
+SAMPLE_WEBM = SAMPLE_DIR / "animated_webm_161x121_2s_vp9a.webm"
+SIZE_MAX = 100000
+
+# Resolution drops at each step, and so does size
+SIZE_PARAMS: List[SizeParam] = [
+    (512 - i * 24, 512 - i * 24, 50, 30, None) for i in range(17)
+]
+
+
+class CallbackNone:
+    def put(self, i: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def sticker(tmp_path: LocalPath) -> StickerConvert:
+    sticker = StickerConvert(
+        SAMPLE_WEBM,
+        Path(tmp_path) / "out.webm",
+        CompOption(format_vid=(".webm",), size_max_vid=SIZE_MAX),
+        CallbackNone(),
+    )
+    sticker.size_max = SIZE_MAX
+    return sticker
+
+
+def _predict_boundary_at(sticker: StickerConvert, step: int) -> None:
+    # Predictor that expects size_max to be just met at step
+    sticker.predictor = SizePredictor(sticker.codec_info_orig, 0, ".webm")
+    sticker.predictor.update(SIZE_PARAMS[step], SIZE_MAX)
+
+
+def test_even_split_untrusted(sticker: StickerConvert) -> None:
+    _predict_boundary_at(sticker, 3)
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, False, 3) == [4, 8, 12]
+
+
+def test_count_limited_to_interval(sticker: StickerConvert) -> None:
+    assert sticker.pick_steps(SIZE_PARAMS, 5, 6, False, 4) == [5, 6]
+
+
+def test_around_center(sticker: StickerConvert) -> None:
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, False, 3, 8) == [7, 8, 9]
+    # Kept within interval
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, False, 3, 0) == [0, 1, 2]
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, False, 3, 16) == [14, 15, 16]
+
+
+def test_around_predicted_boundary(sticker: StickerConvert) -> None:
+    _predict_boundary_at(sticker, 10)
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, True, 3) == [9, 10, 11]
+
+
+def test_even_split_if_none_predicted_to_fit(sticker: StickerConvert) -> None:
+    # Every step predicted to exceed size_max
+    _predict_boundary_at(sticker, 16)
+    sticker.predictor.update(SIZE_PARAMS[16], SIZE_MAX * 100)
+    assert sticker.predictor.boundary(SIZE_PARAMS, 0, 16, SIZE_MAX) is None
+    assert sticker.pick_steps(SIZE_PARAMS, 0, 16, True, 3) == [4, 8, 12]
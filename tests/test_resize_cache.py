@@ -0,0 +1,99 @@
+import os
+import sys
+from pathlib import Path
+from typing import Any, List
+
+import numpy as np
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.media.resize_cache import ResizeCache, ResizeEntry  # type: ignore # noqa: E402
+
+FRAMES_COUNT = 10
+FRAME_SIZE = 4
+FRAME_NBYTES = FRAME_SIZE * FRAME_SIZE * 4
+
+
+class Resizer:
+    # Frame i is filled with i, records which frames were resized
+    def __init__(self) -> None:
+        self.resized: List[List[int]] = []
+
+    def __call__(self, index: List[int]) -> "List[np.ndarray[Any, np.dtype[np.uint8]]]":
+        self.resized.append(index)
+        return [np.full((FRAME_SIZE, FRAME_SIZE, 4), i, dtype=np.uint8) for i in index]
+
+
+def test_entry_grows() -> None:
+    entry = ResizeEntry(FRAMES_COUNT)
+    resizer = Resizer()
+    entry.put([3], resizer([3]))
+    frames_before = entry.frames
+    assert frames_before is not None
+
+    entry.put([0, 5, 7], resizer([0, 5, 7]))
+    assert entry.count == 4
+    assert entry.nbytes == 4 * FRAME_NBYTES
+    assert entry.frames is not None
+    assert len(entry.frames) >= 4
+    # Frames taken before growing are left as they were
+    assert frames_before[0][0, 0, 0] == 3
+
+    frames = entry.take([7, 3, 0])
+    assert [int(frame[0, 0, 0]) for frame in frames] == [7, 3, 0]
+
+
+def test_only_missing_resized() -> None:
+    cache = ResizeCache()
+    resizer = Resizer()
+
+    cache.get_frames(("a",), [0, 2, 4], FRAMES_COUNT, resizer)
+    frames = cache.get_frames(("a",), [2, 3, 4], FRAMES_COUNT, resizer)
+
+    assert resizer.resized == [[0, 2, 4], [3]]
+    assert [int(frame[0, 0, 0]) for frame in frames] == [2, 3, 4]
+    assert cache.size == 4 * FRAME_NBYTES
+
+
+def test_keys_separate() -> None:
+    cache = ResizeCache()
+    resizer = Resizer()
+
+    cache.get_frames(("a",), [0, 1], FRAMES_COUNT, resizer)
+    cache.get_frames(("b",), [0, 1], FRAMES_COUNT, resizer)
+
+    assert resizer.resized == [[0, 1], [0, 1]]
+    assert list(cache.entries) == [("a",), ("b",)]
+
+
+def test_lru_eviction() -> None:
+    # Room for frames of two keys
+    cache = ResizeCache(4 * FRAME_NBYTES)
+    resizer = Resizer()
+
+    cache.get_frames(("a",), [0, 1], FRAMES_COUNT, resizer)
+    cache.get_frames(("b",), [0, 1], FRAMES_COUNT, resizer)
+    # "a" becomes most recently used
+    cache.get_frames(("a",), [0, 1], FRAMES_COUNT, resizer)
+    cache.get_frames(("c",), [0, 1], FRAMES_COUNT, resizer)
+
+    assert list(cache.entries) == [("a",), ("c",)]
+    assert cache.size == 4 * FRAME_NBYTES
+
+    # Evicted frames are resized again
+    cache.get_frames(("b",), [0], FRAMES_COUNT, resizer)
+    assert resizer.resized[-1] == [0]
+
+
+def test_key_in_use_kept() -> None:
+    # Frames of key in use are kept even if they alone exceed size_max
+    cache = ResizeCache(2 * FRAME_NBYTES)
+    resizer = Resizer()
+
+    cache.get_frames(("a",), [0], FRAMES_COUNT, resizer)
+    frames = cache.get_frames(("b",), [0, 1, 2], FRAMES_COUNT, resizer)
+
+    assert list(cache.entries) == [("b",)]
+    assert len(frames) == 3
+    assert cache.size == 3 * FRAME_NBYTES
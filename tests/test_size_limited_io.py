@@ -0,0 +1,52 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.files.size_limited_io import SizeLimitedBytesIO, SizeLimitExceeded  # type: ignore # noqa: E402
+
+
+def test_within_limit() -> None:
+    f = SizeLimitedBytesIO(10)
+    assert f.write(b"12345") == 5
+    f.write(b"67890")
+    assert f.getvalue() == b"1234567890"
+
+
+def test_exceed_limit() -> None:
+    f = SizeLimitedBytesIO(10)
+    f.write(b"12345")
+    with pytest.raises(SizeLimitExceeded) as e:
+        f.write(b"678901")
+    assert e.value.size == 11
+
+
+def test_overwrite_within_limit() -> None:
+    # Muxers seek back to patch headers, which does not add to size
+    f = SizeLimitedBytesIO(10)
+    f.write(b"1234567890")
+    f.seek(0)
+    f.write(b"abc")
+    assert f.getvalue() == b"abc4567890"
+    f.seek(0, os.SEEK_END)
+    with pytest.raises(SizeLimitExceeded):
+        f.write(b"x")
+
+
+def test_no_limit() -> None:
+    for size_limit in (None, 0):
+        f = SizeLimitedBytesIO(size_limit)
+        f.write(b"x" * 1000)
+        assert len(f.getvalue()) == 1000
+
+
+def test_check_size() -> None:
+    f = SizeLimitedBytesIO(10)
+    f.check_size(10)
+    with pytest.raises(SizeLimitExceeded) as e:
+        f.check_size(20)
+    assert e.value.size == 20
@@ -0,0 +1,112 @@
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from tests.common import SAMPLE_DIR
+
+os.chdir(Path(__file__).resolve().parent)
+sys.path.append("../src")
+
+from sticker_convert.utils.media.codec_info import CodecInfo  # type: ignore # noqa: E402
+from sticker_convert.utils.media.size_predictor import SizeParam, SizePredictor  # type: ignore # noqa: E402
+
+SAMPLE_WEBM = SAMPLE_DIR / "animated_webm_161x121_2s_vp9a.webm"
+
+
+def _true_size(param: SizeParam) -> int:
+    # Size following slopes of video prior exactly
+    res_w, res_h, _, frames, _ = param
+    return int(50 * (res_w * res_h) ** 0.8 * frames**0.7)
+
+
+@pytest.fixture(scope="module")
+def codec_info() -> CodecInfo:
+    return CodecInfo(SAMPLE_WEBM)
+
+
+def test_no_prior_not_ready(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 0, ".webm")
+    assert not predictor.ready
+
+    predictor.update((512, 512, 50, 30, None), 100000)
+    assert predictor.ready
+
+
+def test_prior_from_source(codec_info: CodecInfo) -> None:
+    src_size = 100000
+    predictor = SizePredictor(codec_info, src_size, ".webm")
+    assert predictor.ready
+
+    src_param: SizeParam = (
+        codec_info.res[0],
+        codec_info.res[1],
+        100,
+        codec_info.frames,
+        None,
+    )
+    assert predictor.predict(src_param) == pytest.approx(src_size, rel=0.01)
+
+
+def test_fit_calibrates_intercept(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 0, ".webm")
+    measured: SizeParam = (512, 512, 50, 30, None)
+    predictor.update(measured, _true_size(measured))
+
+    for param in ((256, 256, 50, 30, None), (512, 512, 50, 10, None)):
+        assert predictor.predict(param) == pytest.approx(_true_size(param), rel=0.05)
+
+
+def test_fit_learns_slope(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 0, ".webm")
+    # Quality matters for this output, while video prior says it does not
+    for quality in (10, 40, 70, 100):
+        param: SizeParam = (512, 512, quality, 30, None)
+        predictor.update(param, int(_true_size(param) * 4 ** (quality / 100)))
+
+    assert predictor.predict((512, 512, 90, 30, None)) > predictor.predict(
+        (512, 512, 20, 30, None)
+    )
+
+
+def test_update_lower_bound(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 0, ".webm")
+    param: SizeParam = (512, 512, 50, 30, None)
+    predictor.update(param, 100000)
+
+    # Already predicted larger, nothing learnt
+    predictor.update_lower_bound(param, 50000)
+    assert len(predictor.ys) == 1
+
+    predictor.update_lower_bound(param, 200000)
+    assert len(predictor.ys) == 2
+    assert predictor.predict(param) > 100000
+
+
+def test_predict_grid(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 100000, ".webp")
+    pixels = [512 * 512, 256 * 256]
+    qualities: List[Optional[int]] = [90, 50]
+    frames = [30, 10]
+    colors: List[Optional[int]] = [None, 64]
+
+    grid = predictor.predict_grid(pixels, qualities, frames, colors)
+    assert grid.shape == (2, 2, 2, 2)
+    assert grid[1, 0, 1, 0] == pytest.approx(
+        predictor.predict((256, 256, 90, 10, None))
+    )
+
+
+def test_boundary(codec_info: CodecInfo) -> None:
+    predictor = SizePredictor(codec_info, 0, ".webm")
+    predictor.update((512, 512, 50, 30, None), _true_size((512, 512, 50, 30, None)))
+    params: List[SizeParam] = [
+        (res, res, 50, 30, None) for res in (512, 448, 384, 320, 256)
+    ]
+    size_max = _true_size(params[2])
+
+    assert predictor.boundary(params, 0, 4, int(size_max * 1.01)) == 2
+    assert predictor.boundary(params, 3, 4, int(size_max * 1.01)) == 3
+    assert predictor.boundary(params, 0, 4, 1) is None